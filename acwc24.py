@@ -1,12 +1,35 @@
 import argparse
+import glob
+import hashlib
+import io
 import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import ExitStack, nullcontext
 
-from tools.bitconv import put_uint32
-from tools.bmg import Bmg, Message
-from tools.files import read_file, write_file
-from tools.u8 import U8
-from tools.wc24 import is_wc24_keys_available, decrypt, encrypt
+from tools import profile
+from tools.bitconv import get_uint32, put_uint32
+from tools.assets import FolderAssets, PackAssets, write_asset_pack
+from tools.bmg import Bmg, Message, to_json
+from tools.catalogue import Catalogue, CatalogueEntry, get_schema, write_catalogue
+from tools.files import TeeWriter, aread_file, awrite_file, read_file, write_file
+from tools.incremental import BuildState
+from tools.items import ItemIndex, get_item_names
+from tools.u8 import U8, U8Writer
+from tools.wc24 import DEFAULT_KEYS, KEY_DIR_ENV, WC24_MAGIC, Wc24Writer, is_wc24_keys_available, decrypt_stream, \
+    set_key_dir, verify_file
 
+# asyncio, concurrent.futures and the HTTP server are imported where they are needed, as they take longer to import
+# than everything else combined
+
+TOOL_VERSION = "1.1.0"
 PAPERS = ["butterfly", "airmail", "New_Year_s_cards", "lacy", "cloudy", "petal", "snowy", "maple_leaf", "lined",
           "notebook", "flowery", "polka_dot", "weathered", "ribbon", "sparkly", "vine", "formal", "snowman", "card",
           "leopard", "cow", "camouflage", "hamburger", "piano", "Nook", "invite_card", "birthday_card", "four_leaf",
@@ -40,27 +63,41 @@ DEFAULT_BODIES = {
     "Japanese": "Thank you for using\nRiiConnect24. Attached is\na present from us:\n{0}\nEnjoy!",  # placeholder
     "Korean": "Thank you for using\nRiiConnect24. Attached is\na present from us:\n{0}\nEnjoy!"  # placeholder
 }
+LETTER_FILES = {
+    "UsEnglish": "ltrue.bmg",
+    "UsFrench": "ltruf.bmg",
+    "UsSpanish": "ltrus.bmg",
+    "EuEnglish": "ltree.bmg",
+    "EuFrench": "ltref.bmg",
+    "German": "ltreg.bmg",
+    "Italian": "ltrei.bmg",
+    "EuSpanish": "ltres.bmg",
+    "Japanese": "ltrjj.bmg",
+    "Korean": "ltrkk.bmg"
+}
+REGION_LOCALES = {
+    "E": ["UsEnglish", "UsFrench", "UsSpanish"],
+    "P": ["EuEnglish", "EuFrench", "German", "Italian", "EuSpanish"],
+    "J": ["Japanese"],
+    "K": ["Korean"]
+}
+REGION_LOCALES["All"] = [locale for locales in REGION_LOCALES.values() for locale in locales]
 
-
-def get_item_name(itemdata, off):
-    return itemdata[off:off+0x22].decode("utf-16-be").strip("\0")
+PAPER_IDS = {paper: paper_id for paper_id, paper in enumerate(PAPERS)}
+REGIONS = list(REGION_LOCALES)
+LOCALES = list(LETTER_FILES)
+LETTER_FIELDS = ["Header", "Body", "Footer", "Sender"]
+INFO_FIELDS = ["Unk0", "Unk4", "LetterId", "UnkC", "Unk10"]
+CATALOGUE_SCHEMA = get_schema([PAPERS, REGIONS, LOCALES])
 
 
-def get_item_names(itemdata):
-    ret = dict()
-    ret["Japanese"] = get_item_name(itemdata, 0x012)
-    ret["UsEnglish"] = get_item_name(itemdata, 0x034)
-    ret["UsSpanish"] = get_item_name(itemdata, 0x056)
-    ret["UsFrench"] = get_item_name(itemdata, 0x078)
-    ret["EuEnglish"] = get_item_name(itemdata, 0x09A)
-    ret["German"] = get_item_name(itemdata, 0x0BC)
-    ret["Italian"] = get_item_name(itemdata, 0x0DE)
-    ret["EuSpanish"] = get_item_name(itemdata, 0x100)
-    ret["EuFrench"] = get_item_name(itemdata, 0x122)
-    ret["Korean"] = get_item_name(itemdata, 0x144)
-    return ret
+def get_paper_id(paper: str) -> int:
+    if paper not in PAPER_IDS:
+        raise ValueError("Unknown stationery {0}".format(paper))
+    return PAPER_IDS[paper]
 
 
+@profile.profiled("create_letter")
 def create_letter(dlc_info: str, locale: str, item_names: dict):
     paper = dlc_info["Paper"] if "Paper" in dlc_info else PAPERS[0]
     # Check if letter exists for specified locale
@@ -84,7 +121,7 @@ def create_letter(dlc_info: str, locale: str, item_names: dict):
         (data["Body"], default_attributes),
         (data["Footer"], default_attributes),
         (data["Sender"], default_attributes),
-        ("{0}".format(PAPERS.index(paper) + 400), default_attributes),
+        ("{0}".format(get_paper_id(paper) + 400), default_attributes),
         ("", default_attributes)
     ]
 
@@ -100,83 +137,1366 @@ def create_letter(dlc_info: str, locale: str, item_names: dict):
     return bmg.save()
 
 
-def create(dlc_name: str, keep_decrypted: bool = False):
-    dlc_info = json.loads(read_file("src/" + dlc_name + ".json"))
+def validate_manifest(dlc_info: dict):
+    if not isinstance(dlc_info, dict):
+        raise Exception("Error: The package definition is not an object.")
+
+    for key in INFO_FIELDS:
+        value = dlc_info.get(key)
+        if type(value) is not int or not 0 <= value <= 0xFFFFFFFF:
+            raise Exception("Error: {0} is not a 32-bit unsigned integer.".format(key))
+    for key in ["ItemFile", "DesignFile", "NpcFile"]:
+        if not isinstance(dlc_info.get(key), str):
+            raise Exception("Error: {0} is not a file name.".format(key))
+
+    regions = dlc_info.get("Regions")
+    if not isinstance(regions, list) or not regions:
+        raise Exception("Error: Regions is not a list of regions.")
+    for region in regions:
+        if region not in REGION_LOCALES:
+            raise Exception("Error: Unknown region {0}.".format(region))
+    if len(set(regions)) != len(regions):
+        raise Exception("Error: Regions contains duplicates.")
+
+    if "Paper" in dlc_info and dlc_info["Paper"] not in PAPER_IDS:
+        raise Exception("Error: Unknown stationery {0}.".format(dlc_info["Paper"]))
+
+    letters = dlc_info.get("Letters", dict())
+    if not isinstance(letters, dict):
+        raise Exception("Error: Letters is not an object.")
+    for locale, letter in letters.items():
+        if locale not in LETTER_FILES:
+            raise Exception("Error: Unknown locale {0}.".format(locale))
+        if not isinstance(letter, dict) or not all(isinstance(letter.get(key), str) for key in LETTER_FIELDS):
+            raise Exception("Error: The {0} letter needs a header, body, footer and sender.".format(locale))
+
+
+def _to_catalogue_entry(dlc_name: str, stamp: tuple, sha1: bytes, dlc_info: dict) -> CatalogueEntry:
+    # Papers, regions and locales are resolved to their IDs once, so builds do not have to look them up
+    letters = {LOCALES.index(locale): tuple(letter[key] for key in LETTER_FIELDS)
+               for locale, letter in dlc_info.get("Letters", dict()).items()}
+
+    return CatalogueEntry(dlc_name, stamp, sha1, tuple(dlc_info[key] for key in INFO_FIELDS),
+                          (dlc_info["ItemFile"], dlc_info["DesignFile"], dlc_info["NpcFile"]),
+                          get_paper_id(dlc_info.get("Paper", PAPERS[0])),
+                          tuple(REGIONS.index(region) for region in dlc_info["Regions"]), letters)
+
+
+def _from_catalogue_entry(entry: CatalogueEntry) -> dict:
+    dlc_info = {"Regions": [REGIONS[region] for region in entry.regions]}
+    dlc_info.update(zip(INFO_FIELDS, entry.info))
+    dlc_info.update(zip(["ItemFile", "DesignFile", "NpcFile"], entry.files))
+    dlc_info["Paper"] = PAPERS[entry.paper]
+
+    if entry.letters:
+        dlc_info["Letters"] = {LOCALES[locale]: dict(zip(LETTER_FIELDS, texts))
+                               for locale, texts in entry.letters.items()}
+
+    return dlc_info
+
+
+def _get_file_stamp(path: str):
+    try:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+class Workspace:
+    # The folders of a project. Everything is relative to the current folder by default.
+    def __init__(self, root: str = "", assets=None, catalogue: Catalogue = None):
+        self.root = root
+        self.src = os.path.join(root, "src")
+        self.build = os.path.join(root, "build")
+        self.assets = assets or FolderAssets(*[os.path.join(root, folder) for folder in ["items", "designs", "npcs"]])
+        self.catalogue = catalogue
+
+    def get_manifest_path(self, dlc_name: str) -> str:
+        return os.path.join(self.src, dlc_name + ".json")
+
+    def get_output_path(self, dlc_name: str, region: str) -> str:
+        return os.path.join(self.build, dlc_name + "_" + region + ".arc")
+
+    def get_state_path(self, dlc_name: str) -> str:
+        return os.path.join(self.build, ".acwc24", dlc_name + ".json")
+
+    def get_catalogue_path(self) -> str:
+        return os.path.join(self.build, "catalogue.bin")
+
+    def get_pack_path(self) -> str:
+        return os.path.join(self.build, "assets.pack")
+
+    def load_catalogue(self) -> bool:
+        # Without a usable catalogue the package definitions are simply parsed again
+        path = self.get_catalogue_path()
+
+        if os.path.isfile(path):
+            try:
+                self.catalogue = Catalogue(path, CATALOGUE_SCHEMA)
+            except Exception as e:
+                print("Ignoring catalogue, run the compile command again. {0}".format(e))
+
+        return self.catalogue is not None
+
+    def get_compiled_manifest(self, dlc_name: str):
+        # Compiled package definitions are used as long as their file did not change since
+        entry = self.catalogue.get_entry(dlc_name) if self.catalogue else None
+
+        if entry and entry.stamp == _get_file_stamp(self.get_manifest_path(dlc_name)):
+            return _from_catalogue_entry(entry)
+        return None
+
+    def load_manifest(self, dlc_name: str) -> dict:
+        dlc_info = self.get_compiled_manifest(dlc_name)
+        return dlc_info if dlc_info is not None else json.loads(read_file(self.get_manifest_path(dlc_name)))
+
+
+DEFAULT_WORKSPACE = Workspace()
+
+
+def _get_cached_size(value) -> int:
+    # Only payloads count towards the size of a cache, names, paths and lists of outputs are negligible
+    if isinstance(value, memoryview):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_get_cached_size(part) for part in value)
+    return 0
+
+
+class BuildCache:
+    def __init__(self, verbose: bool = False, max_entries: int = None, max_size: int = None):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.verbose = verbose
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, key: tuple, value):
+        # Called with the lock held. Values that would evict everything else are not kept.
+        size = _get_cached_size(value) if self.max_size else 0
+        if self.max_size and size > self.max_size:
+            return
+
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self.size += size
+
+        while self._entries and ((self.max_entries and len(self._entries) > self.max_entries) or
+                                 (self.max_size and self.size > self.max_size)):
+            self.size -= self._entries.popitem(last=False)[1][1]
+
+    def find(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+    def put(self, key: tuple, value):
+        with self._lock:
+            self._store(key, value)
+
+    def get(self, key: tuple, factory):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                if self.verbose:
+                    print("Cache hit: {0} {1}".format(key[0], key[1]))
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
 
-    # Create info.bin
+            self.misses += 1
+
+        # Values are created outside of the lock, so other inputs can be loaded at the same time
+        value = factory()
+
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key][0]
+
+            self._store(key, value)
+            return value
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"Entries": len(self._entries), "Size": self.size, "MaxSize": self.max_size, "Hits": self.hits,
+                    "Misses": self.misses}
+
+
+def create_info(dlc_info: dict) -> bytes:
     info_bin = bytearray(20)
     put_uint32(info_bin, 0x00, dlc_info["Unk0"])
     put_uint32(info_bin, 0x04, dlc_info["Unk4"])
     put_uint32(info_bin, 0x08, dlc_info["LetterId"])
     put_uint32(info_bin, 0x0C, dlc_info["UnkC"])
     put_uint32(info_bin, 0x10, dlc_info["Unk10"])
+    return bytes(info_bin)
+
+
+def _get_letter_key(dlc_info: dict, locale: str, item_names: dict) -> tuple:
+    # Everything that ends up in the letter: its text or the default text's item name, and the paper
+    letter = dlc_info["Letters"].get(locale) if "Letters" in dlc_info else None
+    item_name = item_names[locale] if letter is None else None
+    paper = dlc_info["Paper"] if "Paper" in dlc_info else PAPERS[0]
+    return "letter", locale, json.dumps(letter, sort_keys=True), item_name, paper
+
+
+def _get_build_digests(state: BuildState, dlc_name: str, dlc_info: dict, keep_decrypted: bool,
+                       workspace: Workspace) -> dict:
+    values = [TOOL_VERSION, keep_decrypted, is_wc24_keys_available()]
+    paths = [workspace.get_manifest_path(dlc_name), DEFAULT_KEYS.rsa_path, DEFAULT_KEYS.aes_path]
 
+    # Payloads without a file of their own, like those in an asset pack, are identified by their stamp instead
+    for kind, key in [("item", "ItemFile"), ("design", "DesignFile"), ("npc", "NpcFile")]:
+        if dlc_info[key]:
+            path = workspace.assets.get_path(kind, dlc_info[key])
+            if path is None:
+                values.append([kind, dlc_info[key], workspace.assets.get_stamp(kind, dlc_info[key])])
+            else:
+                paths.append(path)
+
+    digest = state.hash_inputs(values, paths)
+    return {region: state.hash_inputs([digest, region], []) for region in dlc_info["Regions"]}
+
+
+def _get_input_loaders(dlc_info: dict, cache: BuildCache, preload: bool, assets) -> dict:
+    # Every input has its own loader, so that they can be fetched one after another or all at once
+    info_fields = tuple(dlc_info[key] for key in INFO_FIELDS)
     item_file_name = dlc_info["ItemFile"]
-    design_file_name = dlc_info["DesignFile"]
-    npc_file_name = dlc_info["NpcFile"]
 
-    if item_file_name:
-        item_data = read_file("items/" + item_file_name)
-        itemnames = get_item_names(item_data)
-    else:
-        item_data = None
-        itemnames = None
-    design_data = read_file("designs/" + design_file_name) if design_file_name else None
-    npc_data = read_file("npcs/" + npc_file_name) if npc_file_name else None
+    def load_info():
+        return cache.get(("info.bin", info_fields), lambda: create_info(dlc_info))
+
+    def read_item():
+        item_data = assets.read("item", item_file_name)
+
+        if item_data is None:
+            raise Exception("Error: Cannot find item file {0}.".format(item_file_name))
+
+        return item_data, get_item_names(item_data)
+
+    # The stamps are part of the keys, so long-lived caches notice changed files
+    def load_item():
+        if not item_file_name:
+            return None, None
+
+        return cache.get(("item", item_file_name, assets.get_stamp("item", item_file_name)), read_item)
+
+    # Payloads are streamed from their files, unless they are kept in memory for repeated builds
+    def load_payload(kind, file_name):
+        def get_payload():
+            source = assets.get_source(kind, file_name)
+            return assets.read(kind, file_name) if preload and isinstance(source, str) else source
+
+        def load():
+            if not file_name:
+                return None
+
+            return cache.get((kind, file_name, assets.get_stamp(kind, file_name)), get_payload)
+
+        return load
+
+    return {
+        "info.bin": load_info,
+        "item": load_item,
+        "design": load_payload("design", dlc_info["DesignFile"]),
+        "npc": load_payload("npc", dlc_info["NpcFile"])
+    }
+
+
+def _get_inputs(dlc_info: dict, cache: BuildCache, preload: bool = False, assets=None) -> dict:
+    loaders = _get_input_loaders(dlc_info, cache, preload, assets or DEFAULT_WORKSPACE.assets)
+    inputs = {name: load() for name, load in loaders.items()}
+    inputs["item"], inputs["itemnames"] = inputs["item"]
+    return inputs
+
+
+async def _aget_inputs(dlc_info: dict, cache: BuildCache, assets) -> dict:
+    import asyncio
+
+    loaders = _get_input_loaders(dlc_info, cache, True, assets)
+    values = await asyncio.gather(*[asyncio.to_thread(load) for load in loaders.values()])
+
+    inputs = dict(zip(loaders, values))
+    inputs["item"], inputs["itemnames"] = inputs["item"]
+    return inputs
+
+
+def _create_archive(dlc_info: dict, region: str, inputs: dict, cache: BuildCache) -> U8Writer:
+    # Create basic archive, payloads are streamed from their files while writing
+    archive = U8Writer()
+    archive.add_file("info.bin", inputs["info.bin"])
+
+    # Add contents to archive
+    if inputs["item"]:
+        archive.add_file("item.bin", inputs["item"])
+
+        for locale in REGION_LOCALES.get(region, []):
+            letter = cache.get(_get_letter_key(dlc_info, locale, inputs["itemnames"]),
+                               lambda: create_letter(dlc_info, locale, inputs["itemnames"]))
+            archive.add_file(LETTER_FILES[locale], letter)
+    if inputs["design"]:
+        archive.add_file("design.bin", inputs["design"])
+    if inputs["npc"]:
+        archive.add_file(dlc_info["NpcFile"], inputs["npc"])
+
+    return archive
+
+
+def _write_archive(archive: U8Writer, out_path: str, keep_decrypted: bool, open_sink, verbose: bool = True) -> list:
+    # Save and encrypt the archive if possible. open_sink opens the file-like sink of an output path.
+    if not is_wc24_keys_available():
+        if verbose:
+            print("Skipped RSA-AES signing due to missing key(s).")
+
+        with open_sink(out_path) as f:
+            archive.write(f)
+        return [out_path]
+
+    paths = ([out_path] if keep_decrypted else []) + [out_path + ".wc24"]
+
+    with ExitStack() as stack:
+        sinks = [stack.enter_context(open_sink(path)) for path in paths]
+        writer = Wc24Writer(sinks[-1])
+        archive.write(TeeWriter(sinks[0], writer) if keep_decrypted else writer)
+        writer.finish()
+
+    return paths
+
+
+def _write_archive_to_memory(archive: U8Writer, out_path: str, keep_decrypted: bool, verbose: bool = True) -> list:
+    sinks = dict()
+
+    def open_sink(path):
+        sinks[path] = io.BytesIO()
+        return nullcontext(sinks[path])
+
+    paths = _write_archive(archive, out_path, keep_decrypted, open_sink, verbose)
+    return [(path, sinks[path].getvalue()) for path in paths]
+
+
+def _save_archive(archive: U8Writer) -> bytes:
+    return _write_archive_to_memory(archive, "", False, False)[0][1]
+
+
+def build_region(dlc_info: dict, region: str, inputs: dict, cache: BuildCache) -> bytes:
+    return _save_archive(_create_archive(dlc_info, region, inputs, cache))
+
+
+def _remove_output(path: str):
+    # Outputs may be links to other outputs, so they are replaced rather than written through
+    if os.path.lexists(path):
+        os.remove(path)
+
+
+def _open_output(path: str):
+    _remove_output(path)
+    return open(path, "wb")
+
+
+def _link_outputs(sources: list, out_path: str, link: str) -> list:
+    written = []
+
+    for source in sources:
+        path = out_path + (".wc24" if source.endswith(".arc.wc24") else "")
+        written.append(path)
+
+        if source == path:
+            continue
+        _remove_output(path)
+
+        # Links fall back to copies where the file system does not support them
+        with profile.stage("link"):
+            try:
+                if link == "hard":
+                    os.link(source, path)
+                elif link == "symbolic":
+                    os.symlink(os.path.relpath(source, os.path.dirname(path)), path)
+                else:
+                    shutil.copyfile(source, path)
+            except OSError:
+                shutil.copyfile(source, path)
+
+    return written
+
+
+def _group_archives(dlc_info: dict, stale: list, inputs: dict, keep_decrypted: bool, cache: BuildCache) -> tuple:
+    # Regions whose archives have the same contents, like those of packages without an item, are only built once
+    archives = dict()
+    for region in stale:
+        with profile.region(region):
+            archives[region] = _create_archive(dlc_info, region, inputs, cache)
+
+    keys = {region: ("archive", archive.get_digest(), keep_decrypted, is_wc24_keys_available())
+            for region, archive in archives.items()}
+
+    unique = dict()
+    for region in stale:
+        unique.setdefault(keys[region], region)
+
+    return archives, keys, unique
+
+
+def _get_output_stamp(path: str):
+    try:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+def _put_built(cache: BuildCache, key: tuple, written: list):
+    cache.put(key, [(path, _get_output_stamp(path)) for path in written])
+
+
+def _find_built(cache: BuildCache, key: tuple):
+    # Earlier packages sharing the cache may already have written the same archive. Outputs that were removed or
+    # rewritten since then no longer hold it.
+    outputs = cache.find(key)
+
+    if outputs and all(stamp and _get_output_stamp(path) == stamp for path, stamp in outputs):
+        return [path for path, _ in outputs]
+    return None
+
+
+def _get_stale_regions(dlc_name: str, dlc_info: dict, keep_decrypted: bool, incremental: bool,
+                       workspace: Workspace) -> tuple:
+    # Only rebuild regions whose inputs changed since the last incremental build
+    state = BuildState(workspace.get_state_path(dlc_name)) if incremental else None
+    digests = _get_build_digests(state, dlc_name, dlc_info, keep_decrypted, workspace) if state else dict()
+    stale = [region for region in dict.fromkeys(dlc_info["Regions"])
+             if not state or not state.is_current(region, digests[region])]
+
+    return state, digests, stale
+
+
+def _finish_create(dlc_name: str, dlc_info: dict, state: BuildState, digests: dict, built: dict, verbose: bool,
+                   cache: BuildCache, counts: tuple) -> list:
+    out_paths = []
 
-    # Create separate distributables for each target region
     for region in dlc_info["Regions"]:
-        # Create basic archive
-        archive = U8()
-        archive.add_file("info.bin", info_bin)
-
-        # Add contents to archive
-        if item_data:
-            archive.add_file("item.bin", item_data)
-
-            if region == "E" or region == "All":
-                archive.add_file("ltrue.bmg", create_letter(dlc_info, "UsEnglish", itemnames))
-                archive.add_file("ltruf.bmg", create_letter(dlc_info, "UsFrench", itemnames))
-                archive.add_file("ltrus.bmg", create_letter(dlc_info, "UsSpanish", itemnames))
-            if region == "P" or region == "All":
-                archive.add_file("ltree.bmg", create_letter(dlc_info, "EuEnglish", itemnames))
-                archive.add_file("ltref.bmg", create_letter(dlc_info, "EuFrench", itemnames))
-                archive.add_file("ltreg.bmg", create_letter(dlc_info, "German", itemnames))
-                archive.add_file("ltrei.bmg", create_letter(dlc_info, "Italian", itemnames))
-                archive.add_file("ltres.bmg", create_letter(dlc_info, "EuSpanish", itemnames))
-            if region == "J" or region == "All":
-                archive.add_file("ltrjj.bmg", create_letter(dlc_info, "Japanese", itemnames))
-            if region == "K" or region == "All":
-                archive.add_file("ltrkk.bmg", create_letter(dlc_info, "Korean", itemnames))
-        if design_data:
-            archive.add_file("design.bin", design_data)
-        if npc_data:
-            archive.add_file(npc_file_name, npc_data)
-
-        # Save and encrypt the archive if possible
-        output = archive.save()
-        out_path = "build/" + dlc_name + "_" + region + ".arc"
-
-        if is_wc24_keys_available():
-            if keep_decrypted:
-                write_file(out_path, output)
-            out_path += ".wc24"
-            output = encrypt(output)
+        if region in built:
+            written = built[region]
+            if state:
+                state.update(region, digests[region], written)
         else:
-            print("Skipped RSA-AES signing due to missing key(s).")
+            written = state.get_outputs(region)
+
+        out_paths += written[-1:]
+
+    if state:
+        state.save()
+    if verbose:
+        if built:
+            # The cache may be shared by several packages, counts holds its hits and misses before this one was built
+            print("{0}: {1} cache hit(s), {2} miss(es)".format(dlc_name, cache.hits - counts[0],
+                                                               cache.misses - counts[1]))
+        else:
+            print("{0}: up to date".format(dlc_name))
+
+    return out_paths
+
+
+LINK_MODES = ["copy", "hard", "symbolic"]
+
+_region_pool = None
+
+
+def _init_region_worker(rsa_path: str, aes_path: str):
+    DEFAULT_KEYS.set_paths(rsa_path, aes_path)
+
+
+def _get_region_pool(jobs: int):
+    # The pool is kept for later packages, so its workers load the keys and crypto modules only once
+    global _region_pool
+    config = (jobs, DEFAULT_KEYS.rsa_path, DEFAULT_KEYS.aes_path)
+
+    if _region_pool is None or _region_pool[0] != config:
+        from concurrent.futures import ProcessPoolExecutor
+
+        if _region_pool is not None:
+            _region_pool[1].shutdown()
+        _region_pool = config, ProcessPoolExecutor(max_workers=jobs, initializer=_init_region_worker,
+                                                   initargs=config[1:])
+
+    return _region_pool[1]
+
+
+def _create_region(archive: U8Writer, out_path: str, keep_decrypted: bool) -> list:
+    return _write_archive(archive, out_path, keep_decrypted, _open_output)
+
+
+def create(dlc_name: str, keep_decrypted: bool = False, verbose: bool = False, cache: BuildCache = None,
+           incremental: bool = False, region_jobs: int = None, link: str = "copy", workspace: Workspace = None):
+    cache = cache if cache is not None else BuildCache(verbose)
+    counts = cache.hits, cache.misses
+    workspace = workspace or DEFAULT_WORKSPACE
+    dlc_info = workspace.load_manifest(dlc_name)
+    state, digests, stale = _get_stale_regions(dlc_name, dlc_info, keep_decrypted, incremental, workspace)
+
+    if not stale:
+        return _finish_create(dlc_name, dlc_info, state, digests, dict(), verbose, cache, counts)
+
+    inputs = _get_inputs(dlc_info, cache, assets=workspace.assets)
+    archives, keys, unique = _group_archives(dlc_info, stale, inputs, keep_decrypted, cache)
+    os.makedirs(workspace.build, exist_ok=True)
+
+    # Create separate distributables for each target region, reusing archives that were already written
+    built = dict()
+    pending = []
+
+    for region in unique.values():
+        written = _find_built(cache, keys[region])
+
+        if written:
+            with profile.region(region), profile.stage("region"):
+                built[region] = _link_outputs(written, workspace.get_output_path(dlc_name, region), link)
+        else:
+            pending.append(region)
+
+    # Signing and encrypting hold the GIL with the pure Python backends, so the regions are spread over processes.
+    # Without keys the archives are only copied to their outputs, which is not worth starting any.
+    jobs = max(1, min(region_jobs or os.cpu_count() or 1, len(pending))) if is_wc24_keys_available() else 1
+
+    if jobs > 1:
+        import multiprocessing
+
+        # Workers of batch builds already keep every core busy, and they would wait for a pool of their own on exit
+        if multiprocessing.parent_process() is not None:
+            jobs = 1
+
+    if jobs == 1:
+        for region in pending:
+            with profile.region(region), profile.stage("region"):
+                built[region] = _create_region(archives[region], workspace.get_output_path(dlc_name, region),
+                                               keep_decrypted)
+    else:
+        futures = {region: _get_region_pool(jobs).submit(_create_region, archives[region],
+                                                         workspace.get_output_path(dlc_name, region), keep_decrypted)
+                   for region in pending}
+        for region, future in futures.items():
+            built[region] = future.result()
+
+    for region in pending:
+        _put_built(cache, keys[region], built[region])
+
+    for region in stale:
+        if region not in built:
+            built[region] = _link_outputs(built[unique[keys[region]]], workspace.get_output_path(dlc_name, region),
+                                          link)
+
+    return _finish_create(dlc_name, dlc_info, state, digests, built, verbose, cache, counts)
+
+
+async def acreate(dlc_name: str, keep_decrypted: bool = False, verbose: bool = False, cache: BuildCache = None,
+                  incremental: bool = False, link: str = "copy", workspace: Workspace = None) -> list:
+    import asyncio
+
+    cache = cache if cache is not None else BuildCache(verbose)
+    counts = cache.hits, cache.misses
+    workspace = workspace or DEFAULT_WORKSPACE
+    dlc_info = workspace.get_compiled_manifest(dlc_name)
+    if dlc_info is None:
+        dlc_info = json.loads(await aread_file(workspace.get_manifest_path(dlc_name)))
+    state, digests, stale = await asyncio.to_thread(_get_stale_regions, dlc_name, dlc_info, keep_decrypted,
+                                                    incremental, workspace)
+
+    if not stale:
+        return await asyncio.to_thread(_finish_create, dlc_name, dlc_info, state, digests, dict(), verbose,
+                                       cache, counts)
+
+    # All inputs of the package are fetched at once
+    inputs = await _aget_inputs(dlc_info, cache, workspace.assets)
+    archives, keys, unique = _group_archives(dlc_info, stale, inputs, keep_decrypted, cache)
+    os.makedirs(workspace.build, exist_ok=True)
+    built = dict()
+    writes = []
+
+    # The stage is opened on the worker thread, so that it encloses the stages of the build
+    def build_region_outputs(out_path, archive):
+        with profile.stage("region"):
+            return _write_archive_to_memory(archive, out_path, keep_decrypted)
+
+    # Each region is built while the outputs of the previous one are still being written
+    for region in unique.values():
+        out_path = workspace.get_output_path(dlc_name, region)
+        written = await asyncio.to_thread(_find_built, cache, keys[region])
+
+        if written:
+            built[region] = await asyncio.to_thread(_link_outputs, written, out_path, link)
+            continue
+
+        with profile.region(region):
+            outputs = await asyncio.to_thread(build_region_outputs, out_path, archives[region])
+
+        for path, _ in outputs:
+            _remove_output(path)
+        writes += [asyncio.create_task(awrite_file(path, data)) for path, data in outputs]
+        built[region] = [path for path, _ in outputs]
+
+    await asyncio.gather(*writes)
+
+    for region in stale:
+        if region in built:
+            _put_built(cache, keys[region], built[region])
+        else:
+            built[region] = await asyncio.to_thread(_link_outputs, built[unique[keys[region]]],
+                                                    workspace.get_output_path(dlc_name, region), link)
+
+    return await asyncio.to_thread(_finish_create, dlc_name, dlc_info, state, digests, built, verbose, cache,
+                                   counts)
+
 
-        write_file(out_path, output)
+def build_package(dlc_name: str, dlc_info: dict, assets=None, sink=None, regions: list = None,
+                  cache: BuildCache = None) -> list:
+    # Builds the archives of a package definition in memory, without reading or writing anything but the assets.
+    # Every archive is passed to sink(dlc_name, region, data) as soon as it is done.
+    cache = cache if cache is not None else BuildCache()
+    regions = list(dict.fromkeys(regions or dlc_info["Regions"]))
+    inputs = _get_inputs(dlc_info, cache, True, assets)
+    archives, keys, unique = _group_archives(dlc_info, regions, inputs, False, cache)
+    built = dict()
+    results = []
 
+    for region in regions:
+        if keys[region] not in built:
+            with profile.region(region), profile.stage("region"):
+                built[keys[region]] = _save_archive(archives[region])
 
-def extract(dlcname: str):
-    # Todo: Actually create this, duh...
-    pass
+        results.append((dlc_name, region, built[keys[region]]))
+        if sink:
+            sink(dlc_name, region, built[keys[region]])
 
+    return results
+
+
+def iter_build(manifests, workspace: Workspace = None, jobs: int = None, write: bool = False,
+               cache: BuildCache = None):
+    # Yields (name, region, data) for every archive as soon as it is finished. The manifests are package names, which
+    # are loaded from the workspace, or (name, package definition) pairs. With write, the archives are stored in the
+    # build folder and their paths are yielded instead of their contents.
+    import queue
+    from concurrent.futures import ThreadPoolExecutor
+
+    workspace = workspace or DEFAULT_WORKSPACE
+    cache = cache if cache is not None else BuildCache(max_entries=4096)
+    manifests = list(manifests)
+    results = queue.Queue()
+    if write:
+        os.makedirs(workspace.build, exist_ok=True)
+
+    def sink(dlc_name, region, data):
+        if not write:
+            results.put((dlc_name, region, data))
+            return
+
+        path = workspace.get_output_path(dlc_name, region) + (".wc24" if is_wc24_keys_available() else "")
+        _remove_output(path)
+        write_file(path, data)
+        results.put((dlc_name, region, path))
+
+    def build(manifest):
+        try:
+            dlc_name, dlc_info = (manifest, None) if isinstance(manifest, str) else manifest
+            build_package(dlc_name, dlc_info or workspace.load_manifest(dlc_name), workspace.assets, sink, cache=cache)
+        finally:
+            results.put(None)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs or os.cpu_count() or 1, len(manifests)))) as executor:
+        futures = [executor.submit(build, manifest) for manifest in manifests]
+        remaining = len(futures)
+
+        try:
+            # Every package signals its end with None, failed packages raise their error here
+            while remaining:
+                result = results.get()
+
+                if result is None:
+                    remaining -= 1
+                else:
+                    yield result
+
+            for future in futures:
+                future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+class BuildService:
+    def __init__(self, max_builds: int = None, cache_size: int = 0x10000000, max_entries: int = 4096,
+                 queue_timeout: float = 30.0, verbose: bool = False, workspace: Workspace = None,
+                 input_cache_size: int = 0x10000000):
+        from tools.server import LruCache
+
+        # Payloads are kept in memory, so the inputs are bounded by their size as well as their number
+        self.cache = BuildCache(verbose, max_entries, input_cache_size)
+        self.manifests = LruCache(max_entries, lambda entry: 1)
+        self.archives = LruCache(cache_size, lambda entry: len(entry[1]))
+        self.queue_timeout = queue_timeout
+        self.workspace = workspace or DEFAULT_WORKSPACE
+        self.builds = 0
+
+        # Input hashes are only kept in memory, the state is never saved
+        self._state = BuildState("")
+        self._slots = threading.BoundedSemaphore(max_builds or os.cpu_count() or 1)
+
+    def get_manifest(self, dlc_name: str) -> dict:
+        path = self.workspace.get_manifest_path(dlc_name)
+        stamp = _get_file_stamp(path)
+
+        if stamp is None:
+            raise KeyError("Unknown distributable {0}".format(dlc_name))
+
+        entry = self.manifests.get(dlc_name)
+        if entry and entry[0] == stamp:
+            return entry[1]
+
+        dlc_info = json.loads(read_file(path))
+        self.manifests.put(dlc_name, (stamp, dlc_info))
+        return dlc_info
+
+    def build(self, dlc_name: str, region: str) -> tuple:
+        if not dlc_name or dlc_name != os.path.basename(dlc_name) or dlc_name.startswith("."):
+            raise ValueError("Invalid distributable name {0}".format(dlc_name))
+
+        dlc_info = self.get_manifest(dlc_name)
+        if region not in dlc_info["Regions"]:
+            raise KeyError("{0} is not built for region {1}".format(dlc_name, region))
+
+        # Cached archives are served as long as none of their inputs changed
+        digest = _get_build_digests(self._state, dlc_name, dlc_info, False, self.workspace)[region]
+        file_name = dlc_name + "_" + region + (".arc.wc24" if is_wc24_keys_available() else ".arc")
+
+        entry = self.archives.get((dlc_name, region))
+        if entry and entry[0] == digest:
+            return file_name, entry[1]
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise TimeoutError("Too many builds in progress")
+
+        try:
+            inputs = _get_inputs(dlc_info, self.cache, True, self.workspace.assets)
+            data = build_region(dlc_info, region, inputs, self.cache)
+            self.builds += 1
+        finally:
+            self._slots.release()
+
+        self.archives.put((dlc_name, region), (digest, data))
+        return file_name, data
+
+    def get_stats(self) -> dict:
+        return {
+            "Builds": self.builds,
+            "Archives": self.archives.get_stats(),
+            "Manifests": self.manifests.get_stats(),
+            "Inputs": self.cache.get_stats()
+        }
+
+
+def find_distributables(patterns: list, manifest: str = None, find_all: bool = False,
+                         workspace: Workspace = None) -> list:
+    workspace = workspace or DEFAULT_WORKSPACE
+    names = []
+    patterns = list(patterns)
+
+    if find_all:
+        patterns.append("*")
+    if manifest:
+        with open(manifest, "r", encoding="utf8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    patterns.append(line)
+
+    for pattern in patterns:
+        # Plain names are taken as they are, wildcards are matched against the src folder
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(workspace.get_manifest_path(pattern)))
+            names += [os.path.basename(match)[:-len(".json")] for match in matches]
+        else:
+            names.append(pattern)
+
+    # Remove duplicates but keep the order in which the names were specified
+    return list(dict.fromkeys(names))
+
+
+def compile_catalogue(workspace: Workspace = None, verbose: bool = False) -> dict:
+    workspace = workspace or DEFAULT_WORKSPACE
+    path = workspace.get_catalogue_path()
+    start = time.perf_counter()
+    old = None
+
+    try:
+        old = Catalogue(path, CATALOGUE_SCHEMA) if os.path.isfile(path) else None
+    except Exception:
+        pass
+
+    files = sorted((entry.name[:-len(".json")], entry) for entry in os.scandir(workspace.src)
+                   if entry.name.endswith(".json") and entry.is_file())
+    unchanged = []
+    entries = []
+    failures = dict()
+    known = parsed = 0
+
+    for dlc_name, file in files:
+        stat = file.stat()
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        old_stamp = old.get_stamp(dlc_name) if old else None
+        known += old_stamp is not None
+
+        # Only definitions whose file changed are hashed, and only those whose contents changed are parsed again
+        if old_stamp == stamp:
+            unchanged.append(dlc_name)
+            continue
+
+        data = read_file(file.path)
+        sha1 = hashlib.sha1(data).digest()
+        entry = old.get_entry(dlc_name) if old_stamp else None
+
+        if entry and entry.sha1 == sha1:
+            entry.stamp = stamp
+            entries.append(entry)
+            continue
+
+        try:
+            dlc_info = json.loads(data)
+            validate_manifest(dlc_info)
+            entries.append(_to_catalogue_entry(dlc_name, stamp, sha1, dlc_info))
+            parsed += 1
+
+            if verbose:
+                print("Compiled {0}".format(dlc_name))
+        except Exception as e:
+            failures[dlc_name] = str(e)
+
+    # The catalogue is only written again if an entry was added, updated or dropped
+    removed = len(old) - known if old else 0
+    total = len(unchanged) + len(entries)
+
+    if old is None or entries or len(unchanged) != len(old):
+        entries += [old.get_entry(dlc_name) for dlc_name in unchanged]
+        write_catalogue(path, CATALOGUE_SCHEMA, entries)
+    if old:
+        old.close()
+
+    for dlc_name, error in failures.items():
+        print("Failed to compile {0}: {1}".format(dlc_name, error))
+
+    print("Compiled {0} package definition(s) into {1} in {2:.1f}ms: {3} parsed, {4} unchanged, {5} removed, "
+          "{6} failed".format(total, path, (time.perf_counter() - start) * 1000, parsed, total - parsed, removed,
+                              len(failures)))
+
+    return failures
+
+
+_job_cache = None
+
+
+def _create_job(dlc_name: str, keep_decrypted: bool, verbose: bool = False, incremental: bool = False,
+                region_jobs: int = 1, async_io: bool = False, link: str = "copy", workspace: Workspace = None):
+    global _job_cache
+    start = time.perf_counter()
+
+    # Every worker builds many packages, so they share payloads, letters and identical archives
+    if _job_cache is None:
+        _job_cache = BuildCache(verbose, 4096)
+
+    try:
+        if async_io:
+            import asyncio
+
+            out_paths = asyncio.run(acreate(dlc_name, keep_decrypted, verbose, _job_cache, incremental, link,
+                                            workspace))
+        else:
+            out_paths = create(dlc_name, keep_decrypted, verbose, _job_cache, incremental, region_jobs, link,
+                               workspace)
+        out_size = sum(os.path.getsize(out_path) for out_path in out_paths)
+        return dlc_name, None, out_size, time.perf_counter() - start
+    except Exception:
+        return dlc_name, traceback.format_exc(), 0, time.perf_counter() - start
+
+
+def create_all(dlc_names: list, keep_decrypted: bool = False, jobs: int = None, verbose: bool = False,
+               incremental: bool = False, region_jobs: int = None, async_io: bool = False, link: str = "copy",
+               workspace: Workspace = None) -> list:
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(dlc_names)))
+    start = time.perf_counter()
+    results = []
+
+    # Every package is built in isolation, so a broken one does not stop the others
+    if jobs == 1:
+        for dlc_name in dlc_names:
+            results.append(_create_job(dlc_name, keep_decrypted, verbose, incremental, region_jobs, async_io, link,
+                                       workspace))
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # The pool already keeps every core busy, so each package builds its regions one after another
+            futures = {executor.submit(_create_job, dlc_name, keep_decrypted, verbose, incremental, region_jobs or 1,
+                                       async_io, link, workspace): dlc_name
+                       for dlc_name in dlc_names}
+
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception:
+                    results.append((futures[future], traceback.format_exc(), 0, 0.0))
+
+    elapsed = time.perf_counter() - start
+    failures = [result for result in results if result[1]]
+    out_size = sum(result[2] for result in results)
+
+    for dlc_name, error, _, _ in failures:
+        print("Failed to create {0}:\n{1}".format(dlc_name, error))
+
+    print("Created {0} of {1} distributables in {2:.2f}s using {3} worker(s)".format(
+        len(results) - len(failures), len(dlc_names), elapsed, jobs))
+    if elapsed > 0:
+        print("Throughput: {0:.2f} distributables/s, {1:.2f} MiB/s".format(
+            len(results) / elapsed, out_size / elapsed / 0x100000))
+    if failures:
+        print("Failures: " + ", ".join(sorted(result[0] for result in failures)))
+
+    return results
+
+
+def read_letter(bmg: Bmg) -> dict:
+    messages = bmg.get_messages()
+    letter = {
+        "Header": messages[1].text,
+        "Body": messages[2].text,
+        "Footer": messages[3].text,
+        "Sender": messages[4].text
+    }
+
+    paper_id = int(messages[5].text) - 400 if messages[5].text.isdigit() else -1
+    if 0 <= paper_id < len(PAPERS):
+        letter["Paper"] = PAPERS[paper_id]
+
+    return letter
+
+
+def _get_safe_path(folder: str, file_name: str) -> str:
+    # Names taken from archives are untrusted, they may only refer to a file directly inside the target folder
+    if not file_name or file_name in [".", ".."] or any(c in file_name for c in "/\\\0") or os.path.isabs(file_name):
+        raise Exception("Error: Invalid file name {0!r}.".format(file_name))
+
+    path = os.path.join(folder, file_name)
+    if os.path.dirname(os.path.realpath(path)) != os.path.realpath(folder):
+        raise Exception("Error: {0} is outside of {1}.".format(path, folder))
+
+    return path
+
+
+def _unpack(archive: U8, dlc_name: str, workspace: Workspace):
+    letter_locales = {letter_file: locale for locale, letter_file in LETTER_FILES.items()}
+    paths = [path for path in archive.get_paths() if archive.get_file(path) is not None]
+
+    # Every name is checked before anything is written
+    for path in paths:
+        if path not in ["info.bin", "item.bin", "design.bin"] and path not in letter_locales:
+            _get_safe_path(workspace.assets.get_path("npc", ""), path)
+
+    out_dir = os.path.join(workspace.src, dlc_name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    dlc_info = {"Regions": [], "Unk0": 0, "Unk4": 0, "LetterId": 0, "UnkC": 0, "Unk10": 0,
+                "ItemFile": "", "DesignFile": "", "NpcFile": ""}
+    letters = dict()
+
+    def write_asset(kind, file_name, data):
+        folder = workspace.assets.get_path(kind, "")
+        os.makedirs(folder or ".", exist_ok=True)
+        write_file(_get_safe_path(folder, file_name), data)
+
+    for path in paths:
+        data = archive.get_file(path)
+
+        if path == "info.bin":
+            dlc_info["Unk0"] = get_uint32(data, 0x00)
+            dlc_info["Unk4"] = get_uint32(data, 0x04)
+            dlc_info["LetterId"] = get_uint32(data, 0x08)
+            dlc_info["UnkC"] = get_uint32(data, 0x0C)
+            dlc_info["Unk10"] = get_uint32(data, 0x10)
+        elif path == "item.bin":
+            dlc_info["ItemFile"] = dlc_name + ".bin"
+            write_asset("item", dlc_info["ItemFile"], data)
+        elif path == "design.bin":
+            dlc_info["DesignFile"] = dlc_name + ".bin"
+            write_asset("design", dlc_info["DesignFile"], data)
+        elif path in letter_locales:
+            bmg = Bmg().load(bytes(data))
+            to_json(bmg, os.path.join(out_dir, path[:-len(".bmg")] + ".json"))
+            letters[letter_locales[path]] = read_letter(bmg)
+        else:
+            dlc_info["NpcFile"] = path
+            write_asset("npc", path, data)
+
+    return dlc_info, letters
+
+
+def extract(file_path: str, dlc_name: str = None, verify: bool = True, workspace: Workspace = None) -> str:
+    workspace = workspace or DEFAULT_WORKSPACE
+
+    if not dlc_name:
+        dlc_name = os.path.basename(file_path)
+        for ext in [".wc24", ".arc"]:
+            if dlc_name.endswith(ext):
+                dlc_name = dlc_name[:-len(ext)]
+
+    _get_safe_path(workspace.src, dlc_name)
+
+    # Decrypt into a temporary file so that the archive never has to be held in memory
+    with open(file_path, "rb") as f, tempfile.TemporaryFile() as plain:
+        magic = f.read(4)
+        f.seek(0)
+
+        if len(magic) == 4 and get_uint32(magic, 0x00) == WC24_MAGIC:
+            if not decrypt_stream(f, plain) and verify:
+                raise Exception("Error: Invalid signature in {0}.".format(file_path))
+        else:
+            shutil.copyfileobj(f, plain)
+
+        if not plain.tell():
+            raise Exception("Error: Buffer does not contain U8 data.")
+        plain.flush()
+
+        with mmap.mmap(plain.fileno(), 0, access=mmap.ACCESS_READ) as buf, U8() as archive:
+            archive.load(buf, lazy=True)
+            dlc_info, letters = _unpack(archive, dlc_name, workspace)
+
+    # Guess the target region from the file name or from the included letters
+    suffix = dlc_name.rsplit("_", 1)[-1]
+    if suffix in REGION_LOCALES:
+        dlc_info["Regions"].append(suffix)
+    elif letters:
+        for region in ["All", "E", "P", "J", "K"]:
+            if all(locale in letters for locale in REGION_LOCALES[region]):
+                dlc_info["Regions"].append(region)
+                break
+    if not dlc_info["Regions"]:
+        dlc_info["Regions"].append("All")
+
+    if letters:
+        papers = [letter.pop("Paper") for letter in letters.values() if "Paper" in letter]
+        if papers:
+            dlc_info["Paper"] = papers[0]
+        dlc_info["Letters"] = letters
+
+    # The package definition goes where builds look for it, so extracted packages can be built again right away
+    with open(workspace.get_manifest_path(dlc_name), "w", encoding="utf8") as f:
+        json.dump(dlc_info, f, ensure_ascii=False, indent=4)
+        f.flush()
+
+    return dlc_name
+
+
+def find_wc24_files(patterns: list) -> list:
+    paths = []
+
+    # Folders are searched recursively, everything else is taken as a file name or glob pattern
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths += sorted(glob.glob(os.path.join(pattern, "**", "*.wc24"), recursive=True))
+        elif glob.has_magic(pattern):
+            paths += sorted(glob.glob(pattern, recursive=True))
+        else:
+            paths.append(pattern)
+
+    return list(dict.fromkeys(paths))
+
+
+def _verify_job(file_path: str):
+    try:
+        if not verify_file(file_path):
+            return file_path, "Invalid signature.", os.path.getsize(file_path)
+        return file_path, None, os.path.getsize(file_path)
+    except Exception as e:
+        return file_path, str(e), 0
+
+
+def verify_all(file_paths: list, jobs: int = None, quiet: bool = False) -> list:
+    if not is_wc24_keys_available():
+        raise Exception("RSA-AES keys not initialized. Can't verify data.")
+
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(file_paths)))
+    start = time.perf_counter()
+    results = []
+
+    def report(result):
+        results.append(result)
+        if result[1]:
+            print("FAIL {0}: {1}".format(result[0], result[1]))
+        elif not quiet:
+            print("OK   {0}".format(result[0]))
+
+    # Files are handed out in batches, most of them are too small to be worth a round trip each
+    if jobs == 1:
+        for file_path in file_paths:
+            report(_verify_job(file_path))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for result in executor.map(_verify_job, file_paths, chunksize=max(1, len(file_paths) // (jobs * 8))):
+                report(result)
+
+    elapsed = time.perf_counter() - start
+    failures = [result for result in results if result[1]]
+    size = sum(result[2] for result in results)
+
+    print("Verified {0} file(s): {1} passed, {2} failed in {3:.2f}s using {4} worker(s)".format(
+        len(results), len(results) - len(failures), len(failures), elapsed, jobs))
+    if elapsed > 0:
+        print("Throughput: {0:.2f} files/s, {1:.2f} MiB/s".format(len(results) / elapsed, size / elapsed / 0x100000))
+
+    return results
+
+
+def _add_keys_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--keys", type=str, default=None, help="folder containing the key files")
+
+
+def _use_keys_argument(args):
+    if args.keys:
+        # Worker processes pick the folder up from the environment
+        os.environ[KEY_DIR_ENV] = args.keys
+        set_key_dir(args.keys)
+
+
+def _add_root_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--root", type=str, default="", help="project folder containing src, build and the assets")
+
+
+def _add_pack_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--pack", type=str, nargs="?", const="", default=None,
+                        help="read the assets from an asset pack (build/assets.pack) instead of their folders")
+
+
+def _use_pack_argument(args, workspace: Workspace):
+    if args.pack is not None:
+        workspace.assets = PackAssets(args.pack or workspace.get_pack_path())
+
+
+def main_pack_assets(argv: list):
+    parser = argparse.ArgumentParser(prog="acwc24.py pack-assets",
+                                     description="Store all items, patterns and NPCs in a single asset pack")
+    parser.add_argument("-o", "--output", type=str, default=None, help="pack to write (build/assets.pack)")
+    _add_root_argument(parser)
+    args = parser.parse_args(argv)
+
+    workspace = Workspace(args.root)
+    path = args.output or workspace.get_pack_path()
+    start = time.perf_counter()
+    count, unique, size = write_asset_pack(path, workspace.assets)
+
+    print("Packed {0} asset(s) with {1} unique payload(s) into {2} ({3:.2f} MiB) in {4:.2f}s".format(
+        count, unique, path, size / 0x100000, time.perf_counter() - start))
+
+
+def main_compile(argv: list):
+    parser = argparse.ArgumentParser(prog="acwc24.py compile",
+                                     description="Check all package definitions and compile them into a catalogue")
+    parser.add_argument("-v", "--verbose", action="store_true", help="list every package definition parsed again")
+    _add_root_argument(parser)
+    args = parser.parse_args(argv)
+
+    if compile_catalogue(Workspace(args.root), args.verbose):
+        raise SystemExit(1)
+
+
+def main_verify(argv: list):
+    parser = argparse.ArgumentParser(prog="acwc24.py verify", description="Check the signatures of WC24 files")
+    parser.add_argument("files", type=str, nargs="+", help="files, folders or glob patterns")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only list files that failed")
+    _add_keys_argument(parser)
+    args = parser.parse_args(argv)
+    _use_keys_argument(args)
+
+    file_paths = find_wc24_files(args.files)
+
+    if not file_paths:
+        parser.error("no files found")
+
+    results = verify_all(file_paths, args.jobs, args.quiet)
+    if any(result[1] for result in results):
+        raise SystemExit(1)
+
+
+def main_extract(argv: list):
+    parser = argparse.ArgumentParser(prog="acwc24.py extract", description="Unpack WC24 distributables")
+    parser.add_argument("files", type=str, nargs="+")
+    parser.add_argument("-n", "--name", type=str, default=None, help="name to extract a single file as")
+    parser.add_argument("--no-verify", action="store_true", help="extract even if the signature is invalid")
+    _add_root_argument(parser)
+    _add_keys_argument(parser)
+    args = parser.parse_args(argv)
+    _use_keys_argument(args)
+
+    if args.name and len(args.files) > 1:
+        parser.error("--name can only be used with a single file")
+
+    workspace = Workspace(args.root)
+
+    for file_path in args.files:
+        dlc_name = extract(file_path, args.name, not args.no_verify, workspace)
+        print("Extracted {0} to {1}".format(file_path, workspace.get_manifest_path(dlc_name)))
+
+
+def main_items(argv: list):
+    parser = argparse.ArgumentParser(prog="acwc24.py items", description="Search the item names inside items")
+    parser.add_argument("-f", "--find", type=str, default=None, help="text to search for in the item names")
+    parser.add_argument("-l", "--locale", type=str, default=None, help="only search names of this language")
+    parser.add_argument("-n", "--limit", type=int, default=100)
+    parser.add_argument("--no-refresh", action="store_true", help="do not look for changed item files first")
+    _add_root_argument(parser)
+    args = parser.parse_args(argv)
+    workspace = Workspace(args.root)
+
+    with ItemIndex(os.path.join(workspace.build, "items.db"), workspace.assets.get_path("item", "")) as index:
+        if not args.no_refresh:
+            updated, removed = index.refresh()
+            if updated or removed:
+                print("Indexed {0} changed and removed {1} deleted item file(s)".format(updated, removed))
+
+        if args.find is not None:
+            start = time.perf_counter()
+            results = index.find(args.find, args.locale, args.limit)
+            elapsed = time.perf_counter() - start
+
+            for file, locale, name, _ in results:
+                print("{0:<32} {1:<10} {2}".format(file, locale, name))
+            print("{0} result(s) in {1:.1f}ms".format(len(results), elapsed * 1000))
+
+
+def main_serve(argv: list):
+    parser = argparse.ArgumentParser(prog="acwc24.py serve", description="Build distributables on request")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8024)
+    parser.add_argument("-s", "--socket", type=str, default=None, help="listen on this Unix socket instead")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="maximum number of concurrent builds")
+    parser.add_argument("--cache_size", type=int, default=256, help="MiB of built archives to keep in memory")
+    parser.add_argument("--input_cache_size", type=int, default=256, help="MiB of input payloads to keep in memory")
+    parser.add_argument("--max_entries", type=int, default=4096, help="maximum number of cached inputs")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    _add_root_argument(parser)
+    _add_pack_argument(parser)
+    _add_keys_argument(parser)
+    args = parser.parse_args(argv)
+    _use_keys_argument(args)
+
+    workspace = Workspace(args.root)
+    _use_pack_argument(args, workspace)
+    service = BuildService(args.jobs, args.cache_size * 0x100000, args.max_entries, verbose=args.verbose,
+                           workspace=workspace, input_cache_size=args.input_cache_size * 0x100000)
+    from tools.server import create_server
+
+    server = create_server(service, args.host, args.port, args.socket, args.verbose)
+
+    # Load the keys once up front instead of on the first request
+    if is_wc24_keys_available():
+        DEFAULT_KEYS.get_signer()
+        DEFAULT_KEYS.get_aes()
+    else:
+        print("RSA-AES key(s) missing, serving unencrypted archives.")
+
+    print("Serving on {0}".format(args.socket or "http://{0}:{1}/".format(args.host, args.port)))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+COMMANDS = {
+    "compile": main_compile,
+    "extract": main_extract,
+    "items": main_items,
+    "pack-assets": main_pack_assets,
+    "serve": main_serve,
+    "verify": main_verify
+}
+
+
+def main_create(argv: list):
+    parser = argparse.ArgumentParser(description="ACWC24 -- ACCF distributable creation tool by Aurum")
+    parser.add_argument("name", type=str, nargs="*", help="distributable names or glob patterns inside src")
+    parser.add_argument("-k", "--keep_decrypted", action="store_true")
+    parser.add_argument("-a", "--all", action="store_true", help="create every distributable inside src")
+    parser.add_argument("-m", "--manifest", type=str, help="text file listing one distributable name per line")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes for batch builds")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("-i", "--incremental", action="store_true", help="only rebuild outputs whose inputs changed")
+    parser.add_argument("-r", "--region_jobs", type=int, default=None,
+                        help="number of processes signing and encrypting regions")
+    parser.add_argument("-p", "--profile", type=str, nargs="?", const="", default=None,
+                        help="time every stage and write a Chrome trace to the given file (build/profile.json)")
+    parser.add_argument("--async_io", action="store_true", help="read inputs and write outputs concurrently")
+    parser.add_argument("-l", "--link", type=str, choices=LINK_MODES, default="copy",
+                        help="how to write archives that are identical to one that was already built")
+    _add_root_argument(parser)
+    _add_pack_argument(parser)
+    _add_keys_argument(parser)
+    args = parser.parse_args(argv)
+    _use_keys_argument(args)
+
+    workspace = Workspace(args.root)
+    workspace.load_catalogue()
+    _use_pack_argument(args, workspace)
+    dlc_names = find_distributables(args.name, args.manifest, args.all, workspace)
+
+    if not dlc_names:
+        parser.error("no distributables specified")
+
+    # Stages are only recorded inside this process, so profiled batch builds do not use a process pool. Regions are
+    # built one after another as well, since allocation peaks are tracked for the whole process.
+    profiler = profile.enable() if args.profile is not None else None
+    profile_path = args.profile or os.path.join(workspace.build, "profile.json")
+    jobs = 1 if profiler else args.jobs
+    region_jobs = 1 if profiler else args.region_jobs
+
+    try:
+        # A single explicitly named package is built directly, anything else goes through the batch builder
+        if len(dlc_names) == 1 and args.name == dlc_names and not args.manifest and not args.all:
+            if args.async_io:
+                import asyncio
+
+                asyncio.run(acreate(dlc_names[0], args.keep_decrypted, args.verbose, incremental=args.incremental,
+                                    link=args.link, workspace=workspace))
+            else:
+                create(dlc_names[0], args.keep_decrypted, args.verbose, incremental=args.incremental,
+                       region_jobs=region_jobs, link=args.link, workspace=workspace)
+        else:
+            results = create_all(dlc_names, args.keep_decrypted, jobs, args.verbose, args.incremental,
+                                 region_jobs, args.async_io, args.link, workspace)
+            if any(result[1] for result in results):
+                raise SystemExit(1)
+    finally:
+        if profiler:
+            profile.disable()
+            print(profiler.format_table())
+            profiler.save(profile_path)
+            print("Wrote profile to {0}".format(profile_path))
+
+
+def main(argv: list = None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv and argv[0] in COMMANDS:
+        COMMANDS[argv[0]](argv[1:])
+    else:
+        main_create(argv)
 
-parser = argparse.ArgumentParser(description="ACWC24 -- ACCF distributable creation tool by Aurum")
-parser.add_argument("name", type=str)
-parser.add_argument("-k", "--keep_decrypted", action="store_true")
-args = parser.parse_args()
 
-if args.name:
-    create(args.name, args.keep_decrypted)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools.aes import get_aes_backend, get_aes_backends
+
+SIZES = [0x400 << (2 * i) for i in range(9)]  # 1 KiB ... 64 MiB
+
+
+def format_size(size: int) -> str:
+    if size >= 0x100000:
+        return "{0} MiB".format(size >> 20)
+    return "{0} KiB".format(size >> 10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the throughput of the AES-OFB backends")
+    parser.add_argument("-b", "--backends", type=str, nargs="*", default=None)
+    parser.add_argument("--max-size", type=int, default=SIZES[-1], help="largest payload size in bytes")
+    parser.add_argument("--slow-max-size", type=int, default=0x100000,
+                        help="largest payload size for the pure Python pyaes backend")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    backends = args.backends or get_aes_backends()
+    key = os.urandom(16)
+    iv = os.urandom(16)
+
+    print("{0:>10} {1:>14} {2:>12} {3:>12}".format("size", "backend", "seconds", "MiB/s"))
+
+    for size in [size for size in SIZES if size <= args.max_size]:
+        data = os.urandom(size)
+        reference = None
+
+        for name in backends:
+            if name == "pyaes" and size > args.slow_max_size:
+                continue
+
+            backend = get_aes_backend(name)
+            best = None
+
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                output = backend.ofb(key, iv).update(data)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            # All backends have to produce the same ciphertext
+            if reference is None:
+                reference = output
+            elif output != reference:
+                raise Exception("Error: Backend {0} produced different output for {1}.".format(name, format_size(size)))
+
+            print("{0:>10} {1:>14} {2:>12.4f} {3:>12.2f}".format(
+                format_size(size), name, best, size / max(best, 1e-9) / 0x100000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools.bitconv import U8_NODE_STRUCT, get_records, get_uint24, get_uint32, get_bool, put_bool, put_bytes, \
+    put_records, put_uint24, put_uint32
+
+
+def put_bytes_loop(data, off: int, val):
+    for i in range(len(val)):
+        data[off + i] = val[i]
+
+
+def put_nodes_single(data, records):
+    for i, record in enumerate(records):
+        off = i * 12
+        put_bool(data, off + 0x00, record[0] >> 24 != 0)
+        put_uint24(data, off + 0x01, record[0] & 0xFFFFFF)
+        put_uint32(data, off + 0x04, record[1])
+        put_uint32(data, off + 0x08, record[2])
+
+
+def get_nodes_single(data, count):
+    return [((1 << 24 if get_bool(data, i * 12) else 0) | get_uint24(data, i * 12 + 0x01),
+             get_uint32(data, i * 12 + 0x04), get_uint32(data, i * 12 + 0x08)) for i in range(count)]
+
+
+def report(name: str, old: float, new: float):
+    print("{0:<28} {1:>12.6f}s {2:>12.6f}s {3:>9.1f}x".format(name, old, new, old / max(new, 1e-12)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-byte and bulk helpers of tools.bitconv")
+    parser.add_argument("--copy-size", type=int, default=0x100000)
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payload = os.urandom(args.copy_size)
+    target = bytearray(args.copy_size)
+    records = [((i & 1) << 24 | i * 8, i * 32, i) for i in range(args.nodes)]
+    table = bytearray(U8_NODE_STRUCT.size * args.nodes)
+    put_records(U8_NODE_STRUCT, table, 0, records)
+
+    def best(func):
+        return min(timeit.repeat(func, number=1, repeat=args.repeat))
+
+    assert get_nodes_single(table, args.nodes) == get_records(U8_NODE_STRUCT, table, 0, args.nodes)
+
+    print("{0:<28} {1:>13} {2:>13} {3:>10}".format("benchmark", "per item", "bulk", "speed-up"))
+    report("put_bytes {0} bytes".format(args.copy_size),
+           best(lambda: put_bytes_loop(target, 0, payload)),
+           best(lambda: put_bytes(target, 0, payload)))
+    report("pack {0} U8 nodes".format(args.nodes),
+           best(lambda: put_nodes_single(table, records)),
+           best(lambda: put_records(U8_NODE_STRUCT, table, 0, records)))
+    report("unpack {0} U8 nodes".format(args.nodes),
+           best(lambda: get_nodes_single(table, args.nodes)),
+           best(lambda: get_records(U8_NODE_STRUCT, table, 0, args.nodes)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools.bmg import Bmg, BmgView, Message, _decode_string, _encode_string
+
+WORDS = ["Nook", "bells", "letter", "Tortimer", "présent", "Überraschung", "¡Hola!", "たぬき", "\n", "town"]
+ESCAPES = ["{001A06000200}", "{001A08FF00000000}", "{001A0A0001000000010A}"]
+
+
+def decode_string_reference(data, off: int = 0) -> str:
+    retstr = ""
+
+    while True:
+        char = data[off:off + 2].decode("utf-16be")
+
+        if ord(char) == 0x0000:
+            return retstr
+        elif ord(char) == 0x001A:
+            esclen = data[off + 0x2]
+            retstr += "{" + "".join("{0:02X}".format(b) for b in data[off:off + esclen]) + "}"
+            off += esclen
+        else:
+            retstr += char
+            off += 2
+
+
+def encode_string_reference(message: str):
+    if not message:
+        return "\0".encode("utf-16be")
+
+    encoded = bytearray()
+    cur = 0
+
+    while cur < len(message):
+        if message[cur] == "{":
+            closing = message.index("}", cur)
+            encoded += bytearray.fromhex(message[cur + 1:closing])
+            cur = closing + 1
+        else:
+            encoded += message[cur].encode("utf-16be")
+            cur += 1
+
+    encoded += "\0".encode("utf-16be")
+    return encoded
+
+
+def create_texts(count: int, words: int, seed: int) -> list:
+    rand = random.Random(seed)
+    return [" ".join(rand.choice(WORDS + ESCAPES) for _ in range(rand.randrange(1, words))) for _ in range(count)]
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the BMG string codec with the previous per-character one")
+    parser.add_argument("-n", "--messages", type=int, default=5000)
+    parser.add_argument("-w", "--words", type=int, default=60, help="maximum number of words per message")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = create_texts(args.messages, args.words, args.seed)
+    bmg = Bmg()
+    for text in texts:
+        message = Message()
+        message.text = text
+        message.unk4 = bytes(16)
+        bmg.get_messages().append(message)
+
+    data = bmg.save()
+    strings = [encode_string_reference(text) for text in texts]
+    blob = b"".join(strings)
+    offsets = [0]
+    for encoded in strings[:-1]:
+        offsets.append(offsets[-1] + len(encoded))
+
+    encoded_reference = []
+    encoded_new = []
+    decoded_reference = []
+    decoded_new = []
+
+    results = [
+        ("encode (per character)", timed(lambda: encoded_reference.extend(encode_string_reference(t) for t in texts))),
+        ("encode (bulk)", timed(lambda: encoded_new.extend(_encode_string(t) for t in texts))),
+        ("decode (per character)", timed(lambda: decoded_reference.extend(decode_string_reference(blob, o) for o in offsets))),
+        ("decode (bulk)", timed(lambda: decoded_new.extend(_decode_string(blob, o) for o in offsets))),
+        ("Bmg.load", timed(lambda: Bmg().load(data))),
+        ("BmgView (lazy)", timed(lambda: BmgView(data))),
+        ("Bmg.save", timed(lambda: bmg.save()))
+    ]
+
+    if encoded_reference != encoded_new or decoded_reference != decoded_new or decoded_new != texts:
+        raise Exception("Error: Codec output differs from the reference implementation.")
+
+    print("{0} messages, {1} KiB BMG".format(len(texts), len(data) >> 10))
+    for name, seconds in results:
+        print("{0:<24} {1:>10.4f}s".format(name, seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import acwc24
+from bench_bmg import create_texts
+from fixtures import DESIGN_SIZE, ITEM_SIZE, NPC_SIZE, create_fixtures
+from tools.aes import get_aes_backend
+from tools.bmg import Bmg, Message
+from tools.u8 import U8
+from tools.wc24 import decrypt, encrypt, is_wc24_keys_available
+
+
+def get_peak_rss() -> int:
+    # ru_maxrss is given in KiB on Linux but in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(func, size: int, repeat: int, trace: bool) -> dict:
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    result = {"seconds": min(timings), "mean_seconds": sum(timings) / len(timings), "bytes": size}
+    result["mib_per_s"] = size / max(result["seconds"], 1e-9) / 0x100000
+
+    # Allocation peaks come from a separate run, tracemalloc slows everything down considerably
+    if trace:
+        tracemalloc.start()
+        func()
+        result["peak_alloc"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result["peak_rss"] = get_peak_rss()
+    return result
+
+
+def create_archive(root: str, dlc_info: dict) -> U8:
+    archive = U8()
+    archive.add_file("info.bin", acwc24.create_info(dlc_info))
+
+    with open(os.path.join(root, "items", dlc_info["ItemFile"]), "rb") as f:
+        item_data = f.read()
+    archive.add_file("item.bin", item_data)
+
+    for locale in acwc24.REGION_LOCALES["All"]:
+        letter = acwc24.create_letter(dlc_info, locale, acwc24.get_item_names(item_data))
+        archive.add_file(acwc24.LETTER_FILES[locale], letter)
+
+    for folder, key, path in [("designs", "DesignFile", "design.bin"), ("npcs", "NpcFile", dlc_info["NpcFile"])]:
+        if dlc_info[key]:
+            with open(os.path.join(root, folder, dlc_info[key]), "rb") as f:
+                archive.add_file(path, f.read())
+
+    return archive
+
+
+def run(root: str, args) -> dict:
+    names = create_fixtures(root, args.packages, args.item_size, args.design_size, args.npc_size, args.seed,
+                            not args.no_keys)
+    os.chdir(root)
+
+    report = {
+        "tool_version": acwc24.TOOL_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "aes_backend": get_aes_backend().name,
+        "parameters": vars(args),
+        "stages": dict()
+    }
+    stages = report["stages"]
+
+    bmg = Bmg()
+    for text in create_texts(args.messages, 40, args.seed):
+        message = Message()
+        message.text = text
+        message.unk4 = bytes(16)
+        bmg.get_messages().append(message)
+    bmg_data = bmg.save()
+    stages["Bmg.save"] = measure(bmg.save, len(bmg_data), args.repeat, args.trace)
+
+    # The second package carries an NPC, the largest payload, so it is used for the per-archive stages
+    with open(os.path.join("src", names[min(1, len(names) - 1)] + ".json"), "r", encoding="utf8") as f:
+        archive = create_archive(root, json.load(f))
+    archive_data = archive.save()
+    stages["U8.save"] = measure(archive.save, len(archive_data), args.repeat, args.trace)
+    stages["U8.load"] = measure(lambda: U8().load(archive_data), len(archive_data), args.repeat, args.trace)
+
+    if is_wc24_keys_available():
+        encrypted = encrypt(archive_data)
+        stages["encrypt"] = measure(lambda: encrypt(archive_data), len(archive_data), args.repeat, args.trace)
+        stages["decrypt"] = measure(lambda: decrypt(encrypted), len(archive_data), args.repeat, args.trace)
+
+    def create_all():
+        for name in names:
+            acwc24.create(name, region_jobs=args.region_jobs)
+
+    create_all()
+    out_size = sum(entry.stat().st_size for entry in os.scandir("build") if entry.is_file())
+    stages["create"] = measure(create_all, out_size, args.repeat, args.trace)
+    stages["create"]["packages_per_s"] = len(names) / max(stages["create"]["seconds"], 1e-9)
+
+    report["peak_rss"] = get_peak_rss()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every stage of the packing pipeline on synthetic packages")
+    parser.add_argument("-n", "--packages", type=int, default=10)
+    parser.add_argument("--item-size", type=int, default=ITEM_SIZE)
+    parser.add_argument("--design-size", type=int, default=DESIGN_SIZE)
+    parser.add_argument("--npc-size", type=int, default=NPC_SIZE)
+    parser.add_argument("--messages", type=int, default=1000, help="number of messages for the Bmg.save stage")
+    parser.add_argument("--region-jobs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-keys", action="store_true", help="skip the encrypt and decrypt stages")
+    parser.add_argument("--trace", action="store_true", help="record tracemalloc peaks for every stage")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("--root", type=str, default=None, help="folder for the fixtures, a temporary one by default")
+    parser.add_argument("-o", "--output", type=str, default=None, help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    root = os.path.abspath(args.root) if args.root else tempfile.mkdtemp(prefix="acwc24-bench-")
+
+    try:
+        report = run(root, args)
+    finally:
+        os.chdir(cwd)
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
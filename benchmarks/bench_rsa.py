@@ -0,0 +1,57 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools.signer import get_rsa_backend, get_rsa_backends
+
+
+def create_key(bits: int) -> bytes:
+    import rsa
+
+    _, privkey = rsa.newkeys(bits)
+    return privkey.save_pkcs1("PEM")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the RSA-SHA1 signing backends, in signatures per second "
+                                                 "on a single core")
+    parser.add_argument("-b", "--backends", type=str, nargs="*", default=None)
+    parser.add_argument("-k", "--key", type=str, default=None, help="PEM key to sign with, a new one by default")
+    parser.add_argument("--bits", type=int, default=2048, help="size of the generated key")
+    parser.add_argument("-n", "--signatures", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.key:
+        with open(args.key, "rb") as f:
+            pem = f.read()
+    else:
+        pem = create_key(args.bits)
+
+    backends = args.backends or get_rsa_backends()
+    digests = [hashlib.sha1(os.urandom(64)).digest() for _ in range(args.signatures)]
+    reference = None
+
+    print("{0:>14} {1:>12} {2:>14}".format("backend", "seconds", "signatures/s"))
+
+    for name in backends:
+        signer = get_rsa_backend(name).load_key(pem)
+
+        start = time.perf_counter()
+        signatures = [signer.sign(digest) for digest in digests]
+        elapsed = time.perf_counter() - start
+
+        # PKCS#1 v1.5 signatures are deterministic, so every backend has to produce the very same bytes
+        if reference is None:
+            reference = signatures
+        elif signatures != reference:
+            raise Exception("Error: Backend {0} produced different signatures.".format(name))
+
+        print("{0:>14} {1:>12.4f} {2:>14.1f}".format(name, elapsed, len(digests) / max(elapsed, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SCENARIOS = [
+    ("interpreter", ["-c", "pass"]),
+    ("tools.u8 + tools.bmg", ["-c", "import tools.u8, tools.bmg"]),
+    ("import acwc24", ["-c", "import acwc24"]),
+    ("acwc24.py --help", [os.path.join(ROOT, "acwc24.py"), "--help"])
+]
+
+# None of these may be imported before they are actually used
+LAZY_MODULES = ["rsa", "pyaes", "cryptography", "Crypto", "gmpy2", "asyncio", "http.server", "sqlite3",
+                "concurrent.futures"]
+
+
+def run(args: list, repeat: int) -> float:
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def get_eager_modules() -> list:
+    script = "import acwc24, sys; print(' '.join(name for name in {0!r} if name in sys.modules))".format(LAZY_MODULES)
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return output.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the startup time and check it against a budget")
+    parser.add_argument("-r", "--repeat", type=int, default=10)
+    parser.add_argument("-b", "--budget", type=float, default=None,
+                        help="fail if importing acwc24 takes more than this many milliseconds over the interpreter")
+    args = parser.parse_args()
+
+    results = [(name, run(scenario, args.repeat)) for name, scenario in SCENARIOS]
+    baseline = results[0][1]
+
+    print("{0:<24} {1:>10} {2:>12}".format("scenario", "ms", "overhead ms"))
+    for name, seconds in results:
+        print("{0:<24} {1:>10.1f} {2:>12.1f}".format(name, seconds * 1000, (seconds - baseline) * 1000))
+
+    failed = False
+    eager = get_eager_modules()
+
+    if eager:
+        print("Imported at startup: " + ", ".join(eager))
+        failed = True
+
+    overhead = (dict(results)["import acwc24"] - baseline) * 1000
+    if args.budget is not None and overhead > args.budget:
+        print("Importing acwc24 takes {0:.1f}ms, the budget is {1:.1f}ms".format(overhead, args.budget))
+        failed = True
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
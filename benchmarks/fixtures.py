@@ -0,0 +1,85 @@
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from acwc24 import PAPERS
+from tools.items import ITEM_NAME_OFFSETS, ITEM_NAME_SIZE
+
+ITEM_SIZE = 0x1000
+DESIGN_SIZE = 0x400
+NPC_SIZE = 0x40000
+WORDS = ["Nook", "bell", "chair", "lamp", "shirt", "fish", "table", "clock", "rug", "sofa"]
+
+
+def create_item(rand: random.Random, size: int) -> bytes:
+    data = bytearray(rand.randbytes(max(size, 0x200)))
+
+    for locale, off in ITEM_NAME_OFFSETS.items():
+        name = "{0} {1}".format(rand.choice(WORDS), rand.choice(WORDS))
+        data[off:off + ITEM_NAME_SIZE] = name.encode("utf-16-be").ljust(ITEM_NAME_SIZE, b"\0")
+
+    return bytes(data)
+
+
+def create_keys(root: str):
+    import rsa
+
+    _, privkey = rsa.newkeys(2048)
+    with open(os.path.join(root, "rvforestdl.pem.bin"), "wb") as f:
+        f.write(privkey.save_pkcs1("PEM"))
+    with open(os.path.join(root, "rvforestdl.aes.bin"), "wb") as f:
+        f.write(os.urandom(16))
+
+
+def create_fixtures(root: str, packages: int = 10, item_size: int = ITEM_SIZE, design_size: int = DESIGN_SIZE,
+                    npc_size: int = NPC_SIZE, seed: int = 0, keys: bool = True) -> list:
+    rand = random.Random(seed)
+    names = []
+
+    for folder in ["src", "items", "designs", "npcs", "build"]:
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    # Every package gets an item, and additionally a design or an NPC in alternating order
+    for i in range(packages):
+        name = "bench{0:05d}".format(i)
+        dlc_info = {
+            "Regions": ["E", "P", "J", "K"] if i % 3 else ["All"],
+            "Unk0": 1,
+            "Unk4": 1,
+            "LetterId": i,
+            "UnkC": 0,
+            "Unk10": 0,
+            "ItemFile": name + ".bin",
+            "DesignFile": name + ".bin" if i % 2 == 0 else "",
+            "NpcFile": name + ".arc" if i % 2 == 1 else "",
+            "Paper": rand.choice(PAPERS),
+            "Letters": {
+                "UsEnglish": {
+                    "Header": "Dear \n,",
+                    "Body": "here is your\nspecial item #{0}!".format(i),
+                    "Footer": "from the benchmark",
+                    "Sender": "Benchmark"
+                }
+            }
+        }
+
+        with open(os.path.join(root, "items", name + ".bin"), "wb") as f:
+            f.write(create_item(rand, item_size))
+        if dlc_info["DesignFile"]:
+            with open(os.path.join(root, "designs", name + ".bin"), "wb") as f:
+                f.write(rand.randbytes(design_size))
+        if dlc_info["NpcFile"]:
+            with open(os.path.join(root, "npcs", name + ".arc"), "wb") as f:
+                f.write(rand.randbytes(npc_size))
+        with open(os.path.join(root, "src", name + ".json"), "w", encoding="utf8") as f:
+            json.dump(dlc_info, f, ensure_ascii=False, indent=4)
+
+        names.append(name)
+
+    if keys:
+        create_keys(root)
+
+    return names
@@ -0,0 +1,116 @@
+import os
+
+AES_BLOCK_SIZE = 16
+AES_BACKEND_ENV = "ACWC24_AES_BACKEND"
+AES_BACKEND_ORDER = ["cryptography", "pycryptodome", "pyaes"]
+
+
+class _CryptographyKey:
+    def __init__(self, key):
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms
+
+        # OFB moved to the decrepit module in newer versions of cryptography
+        try:
+            from cryptography.hazmat.decrepit.ciphers.modes import OFB
+        except ImportError:
+            from cryptography.hazmat.primitives.ciphers.modes import OFB
+
+        self._cipher = Cipher
+        self._ofb = OFB
+        self._algorithm = algorithms.AES(bytes(key))
+
+    def ofb(self, iv):
+        return self._cipher(self._algorithm, self._ofb(bytes(iv))).encryptor()
+
+
+class _PycryptodomeStream:
+    def __init__(self, aes):
+        self._aes = aes
+
+    def update(self, data) -> bytes:
+        return self._aes.encrypt(data)
+
+
+class _PycryptodomeKey:
+    def __init__(self, key):
+        from Crypto.Cipher import AES
+
+        self._aes = AES
+        self._key = bytes(key)
+
+    def ofb(self, iv):
+        return _PycryptodomeStream(self._aes.new(self._key, self._aes.MODE_OFB, iv=bytes(iv)))
+
+
+class _PyaesStream:
+    def __init__(self, ofb):
+        self._ofb = ofb
+
+    def update(self, data) -> bytes:
+        # AESModeOfOperationOFB keeps its position in the keystream between calls, but only accepts bytes
+        return self._ofb.encrypt(bytes(data))
+
+
+class _PyaesKey:
+    def __init__(self, key):
+        import pyaes
+
+        self._pyaes = pyaes
+        self._key = bytes(key)
+
+    def ofb(self, iv):
+        return _PyaesStream(self._pyaes.AESModeOfOperationOFB(self._key, bytes(iv)))
+
+
+class AesBackend:
+    def __init__(self, name: str, key_class):
+        self.name = name
+        self._key_class = key_class
+
+    def load_key(self, key):
+        return self._key_class(key)
+
+    def ofb(self, key, iv):
+        return self.load_key(key).ofb(iv)
+
+
+_BACKENDS = {
+    "cryptography": ("cryptography.hazmat.primitives.ciphers", _CryptographyKey),
+    "pycryptodome": ("Crypto.Cipher.AES", _PycryptodomeKey),
+    "pyaes": ("pyaes", _PyaesKey)
+}
+_available = {}
+
+
+def is_aes_backend_available(name: str) -> bool:
+    if name not in _available:
+        try:
+            __import__(_BACKENDS[name][0])
+            _available[name] = True
+        except ImportError:
+            _available[name] = False
+
+    return _available[name]
+
+
+def get_aes_backends() -> list:
+    return [name for name in AES_BACKEND_ORDER if is_aes_backend_available(name)]
+
+
+def get_aes_backend(name: str = None) -> AesBackend:
+    name = name or os.environ.get(AES_BACKEND_ENV)
+
+    if name:
+        if name not in _BACKENDS:
+            raise Exception("Error: Unknown AES backend \"{0}\".".format(name))
+        if not is_aes_backend_available(name):
+            raise Exception("Error: AES backend \"{0}\" is not installed.".format(name))
+    else:
+        available = get_aes_backends()
+
+        if not available:
+            raise Exception("Error: No AES module found. Install cryptography, pycryptodome or pyaes.")
+
+        name = available[0]
+
+    return AesBackend(name, _BACKENDS[name][1])
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import struct
+import zlib
+
+from tools.bitconv import align32, put_records
+from tools.files import read_chunks, read_file
+from tools.hashed import HashedFile
+
+ASSET_KINDS = ["item", "design", "npc"]
+
+ASSET_PACK_MAGIC = 0x4143504B  # "ACPK"
+ASSET_PACK_VERSION = 1
+
+# magic, version, entry count, blob count, hash table offset, entry table offset, blob table offset, string pool offset
+ASSET_PACK_HEADER_STRUCT = struct.Struct(">4I4Q")
+# kind ID, name, blob index
+ASSET_PACK_ENTRY_STRUCT = struct.Struct(">BII")
+# SHA-1 of the contents, offset, size
+ASSET_PACK_BLOB_STRUCT = struct.Struct(">20sQQ")
+
+
+class FolderAssets:
+    # Payloads stored as loose files, with one folder for every kind
+    def __init__(self, items: str = "items", designs: str = "designs", npcs: str = "npcs"):
+        self.folders = {"item": items, "design": designs, "npc": npcs}
+
+    def get_path(self, kind: str, name: str) -> str:
+        return os.path.join(self.folders[kind], name)
+
+    def get_stamp(self, kind: str, name: str):
+        try:
+            stat = os.stat(self.get_path(kind, name))
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def get_source(self, kind: str, name: str):
+        # Missing or empty payload files are left out, just like when they are not specified at all
+        path = self.get_path(kind, name)
+
+        if name and os.path.isfile(path) and os.path.getsize(path):
+            return path
+        return None
+
+    def read(self, kind: str, name: str):
+        return read_file(self.get_path(kind, name)) if name else None
+
+
+class MemoryAssets:
+    # Payloads held in memory, for builds that should not touch the file system at all
+    def __init__(self, items: dict = None, designs: dict = None, npcs: dict = None):
+        self.payloads = {"item": dict(items or {}), "design": dict(designs or {}), "npc": dict(npcs or {})}
+
+    def add(self, kind: str, name: str, data):
+        self.payloads[kind][name] = data
+
+    def get_path(self, kind: str, name: str):
+        return None
+
+    def get_stamp(self, kind: str, name: str):
+        data = self.payloads[kind].get(name)
+        return (id(data), len(data)) if data is not None else None
+
+    def get_source(self, kind: str, name: str):
+        data = self.payloads[kind].get(name)
+        return data if data else None
+
+    def read(self, kind: str, name: str):
+        return self.payloads[kind].get(name)
+
+
+def _get_asset_hash(kind: str, name: str) -> int:
+    return zlib.crc32((kind + "/" + name).encode("utf8"))
+
+
+def write_asset_pack(path: str, assets: FolderAssets) -> tuple:
+    entries = []
+    blob_ids = dict()
+    blob_records = []
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(bytes(align32(ASSET_PACK_HEADER_STRUCT.size)))
+
+        # Payloads come first and are aligned like U8 file data, the tables follow once all offsets are known
+        for kind in ASSET_KINDS:
+            folder = assets.folders[kind]
+            if not os.path.isdir(folder):
+                continue
+
+            for name in sorted(entry.name for entry in os.scandir(folder) if entry.is_file()):
+                offset = f.tell()
+                sha1 = hashlib.sha1()
+
+                with open(os.path.join(folder, name), "rb") as src:
+                    for chunk in read_chunks(src):
+                        sha1.update(chunk)
+                        f.write(chunk)
+
+                # Identical payloads are stored only once, the copy that was just written is dropped again
+                if sha1.digest() in blob_ids:
+                    f.seek(offset)
+                    f.truncate()
+                else:
+                    blob_ids[sha1.digest()] = len(blob_records)
+                    blob_records.append((sha1.digest(), offset, f.tell() - offset))
+                    f.write(bytes(align32(f.tell()) - f.tell()))
+
+                entries.append((kind, name, blob_ids[sha1.digest()]))
+
+        entries.sort(key=lambda entry: (_get_asset_hash(entry[0], entry[1]), entry[0], entry[1]))
+        pool = bytearray()
+        offsets = dict()
+        entry_records = []
+
+        for kind, name, blob_id in entries:
+            if name not in offsets:
+                offsets[name] = len(pool)
+                pool.extend(name.encode("utf8") + b"\0")
+            entry_records.append((ASSET_KINDS.index(kind), offsets[name], blob_id))
+
+        hash_offset = f.tell()
+        entry_offset = hash_offset + 4 * len(entries)
+        blob_offset = entry_offset + ASSET_PACK_ENTRY_STRUCT.size * len(entries)
+        string_offset = blob_offset + ASSET_PACK_BLOB_STRUCT.size * len(blob_records)
+
+        tables = bytearray(string_offset - hash_offset)
+        struct.pack_into(">{0}I".format(len(entries)), tables, 0,
+                         *[_get_asset_hash(kind, name) for kind, name, _ in entries])
+        put_records(ASSET_PACK_ENTRY_STRUCT, tables, entry_offset - hash_offset, entry_records)
+        put_records(ASSET_PACK_BLOB_STRUCT, tables, blob_offset - hash_offset, blob_records)
+        f.write(tables + pool)
+
+        size = f.tell()
+        f.seek(0)
+        f.write(ASSET_PACK_HEADER_STRUCT.pack(ASSET_PACK_MAGIC, ASSET_PACK_VERSION, len(entries), len(blob_records),
+                                              hash_offset, entry_offset, blob_offset, string_offset))
+
+    os.replace(path + ".tmp", path)
+    return len(entries), len(blob_records), size
+
+
+class PackAssets(HashedFile):
+    # Payloads stored in a single asset pack. They are returned as views into the mapped file, so nothing is copied
+    # and no file system calls are needed besides opening the pack.
+    HEADER_STRUCT = ASSET_PACK_HEADER_STRUCT
+    MAGIC = ASSET_PACK_MAGIC
+    VERSION = ASSET_PACK_VERSION
+    DESCRIPTION = "an asset pack"
+
+    def _load_header(self, header: tuple):
+        self._entry_offset, self._blob_offset = header[5:7]
+        self._load_tables(header[2], header[4], header[7])
+        self._view = memoryview(self._buf)
+
+    def _find_blob(self, kind: str, name: str):
+        if not name:
+            return None
+
+        kind_id = ASSET_KINDS.index(kind)
+        key = name.encode("utf8")
+
+        for index in self._find_indices(_get_asset_hash(kind, name)):
+            entry = ASSET_PACK_ENTRY_STRUCT.unpack_from(self._buf,
+                                                        self._entry_offset + ASSET_PACK_ENTRY_STRUCT.size * index)
+
+            if entry[0] == kind_id and self._get_bytes(entry[1]) == key:
+                return ASSET_PACK_BLOB_STRUCT.unpack_from(self._buf,
+                                                          self._blob_offset + ASSET_PACK_BLOB_STRUCT.size * entry[2])
+
+        return None
+
+    def get_path(self, kind: str, name: str):
+        return None
+
+    def get_stamp(self, kind: str, name: str):
+        # The content hash identifies a payload regardless of its name, so shared payloads share cache entries
+        blob = self._find_blob(kind, name)
+        return blob[0].hex() if blob else None
+
+    def get_source(self, kind: str, name: str):
+        blob = self._find_blob(kind, name)
+        return self._view[blob[1]:blob[1] + blob[2]] if blob and blob[2] else None
+
+    def read(self, kind: str, name: str):
+        blob = self._find_blob(kind, name)
+        return self._view[blob[1]:blob[1] + blob[2]] if blob else None
@@ -1,3 +1,4 @@
+import functools
 import struct
 
 
@@ -75,7 +76,7 @@ def get_bytes(data, off: int, size: int) -> bytes:
 
 
 def get_string(data, off: int, charset: str = "ascii") -> str:
-    return data[off:data.find(0x00, off)].decode(charset)
+    return data[off:data.find(b"\0", off)].decode(charset)
 
 
 def put_int8(data, off: int, val: int):
@@ -131,5 +132,28 @@ def put_bool(data, off: int, val: bool):
 
 
 def put_bytes(data, off: int, val):
-    for i in range(len(val)):
-        data[off + i] = val[i]
+    # Slice assignment would silently grow a bytearray, so writes past its end fail like single byte writes do
+    if off + len(val) > len(data):
+        raise IndexError("bytearray index out of range")
+    data[off:off + len(val)] = val
+
+
+# Record layouts for whole tables, packed and unpacked with a single struct call
+U8_NODE_STRUCT = struct.Struct(">III")  # directory flag << 24 | name offset, data offset, data size
+BMG_INF1_STRUCT = struct.Struct(">I16s")  # text offset, attributes
+BMG_MID1_STRUCT = struct.Struct(">I")  # message ID
+
+
+@functools.lru_cache(maxsize=64)
+def _get_table_struct(fmt: str, count: int) -> struct.Struct:
+    return struct.Struct(fmt[0] + fmt[1:] * count)
+
+
+def get_records(record: struct.Struct, data, off: int, count: int) -> list:
+    return list(record.iter_unpack(memoryview(data)[off:off + record.size * count]))
+
+
+def put_records(record: struct.Struct, data, off: int, records: list):
+    if records:
+        fields = [field for entry in records for field in entry]
+        _get_table_struct(record.format, len(records)).pack_into(data, off, *fields)
@@ -1,70 +1,64 @@
 import json
+import re
+import struct
+import sys
+from array import array
+from collections import OrderedDict
 
 from tools.bitconv import *
 
 
-def _decode_esc_sequence(esc) -> str:
-    esclen = esc[0x2] & 0xFF
-    esctype = esc[0x3] & 0xFF
+# Runs of UTF-16BE characters up to the next NUL terminator or 0x001A escape marker
+_TEXT_RUN = re.compile(rb"(?:[^\x00].|\x00[^\x00\x1A])*", re.DOTALL)
+_ESC_SEQUENCE = re.compile(r"\{[^}]*\}")
+_NULL_TERMINATOR = "\0".encode("utf-16be")
+
 
-    retstr = "{"
-    for b in esc:
-        retstr += "{0:02X}".format(b)
-    retstr += "}"
-    return retstr
+def _decode_esc_sequence(esc) -> str:
+    return "{" + bytes(esc).hex().upper() + "}"
 
 
 def _decode_string(data, off: int = 0) -> str:
-    retstr = ""
+    parts = []
 
     while True:
-        char = data[off:off + 2].decode('utf-16be')
-
-        if ord(char) == 0x0000:
-            return retstr
-        elif ord(char) == 0x001A:
-            esclen = get_uint8(data, off + 0x2)
-            retstr += _decode_esc_sequence(data[off:off + esclen])
-            off += esclen
-        else:
-            retstr += char
-            off += 2
+        # Decode everything up to the next control character at once
+        end = _TEXT_RUN.match(data, off).end()
+        if end > off:
+            parts.append(str(data[off:end], "utf-16be"))
+
+        if end + 2 > len(data) or data[end + 1] == 0x00:
+            return "".join(parts)
+
+        esclen = get_uint8(data, end + 0x2)
+        if esclen < 4:
+            raise Exception("Error: Invalid escape sequence at 0x{0:X}.".format(end))
+
+        parts.append(_decode_esc_sequence(data[end:end + esclen]))
+        off = end + esclen
 
 
 def _encode_esc_sequence(escstring: str) -> bytearray:
     escstring = escstring[1:len(escstring) - 1]
-    escparams = escstring.split('=')
 
     return bytearray.fromhex(escstring)
 
 
 def _encode_string(message: str):
-    nullterminator = '\0'.encode("utf-16be")
-
-    if not message or message == "":
-        return nullterminator
+    if not message:
+        return _NULL_TERMINATOR
 
     encoded = bytearray()
-    curIdx = 0
-
-    while curIdx < len(message):
-        curChar = message[curIdx]
-
-        if curChar == '{':
-            closingIdx = curIdx + 1
+    off = 0
 
-            while closingIdx < len(message):
-                if message[closingIdx] == '}':
-                    encoded += _encode_esc_sequence(message[curIdx:closingIdx + 1])
-                    curIdx = closingIdx + 1
-                    break
-                else:
-                    closingIdx += 1
-        else:
-            encoded += curChar.encode("utf-16be")
-            curIdx += 1
+    # Encode the text between escape sequences in whole runs
+    for match in _ESC_SEQUENCE.finditer(message):
+        encoded += message[off:match.start()].encode("utf-16be")
+        encoded += _encode_esc_sequence(match.group())
+        off = match.end()
 
-    encoded += nullterminator
+    encoded += message[off:].encode("utf-16be")
+    encoded += _NULL_TERMINATOR
 
     return encoded
 
@@ -92,6 +86,15 @@ class Message:
         m.unk4 = get_bytes(buf, off + 0x04, 0x10)
         return m
 
+    @staticmethod
+    def from_record(record):
+        m = Message()
+        m.offText, m.unk4 = record
+        return m
+
+    def to_record(self) -> tuple:
+        return self.offText, self.unk4
+
     def pack(self) -> bytes:
         b = bytearray(MESSAGE_SIZE)
         put_uint32(b, 0x00, self.offText)
@@ -125,8 +128,17 @@ class Bmg:
         num_messages = get_uint16(buf, cur + 0x08)
         len_messages = get_uint16(buf, cur + 0x0A)
 
+        # Unpack the whole table at once if the entries have the usual layout
+        if len_messages == MESSAGE_SIZE:
+            entries = get_records(BMG_INF1_STRUCT, buf, cur + 0x10, num_messages)
+        else:
+            entries = None
+
         for i in range(num_messages):
-            message = Message.unpack(buf, cur + 0x10 + len_messages * i)
+            if entries:
+                message = Message.from_record(entries[i])
+            else:
+                message = Message.unpack(buf, cur + 0x10 + len_messages * i)
             message.text = _decode_string(buf, cur + section_size + 0x8 + message.offText)
             self.get_messages().append(message)
 
@@ -162,10 +174,7 @@ class Bmg:
         put_uint16(out_data, cur + 0x8, num_messages)
         put_uint16(out_data, cur + 0xA, MESSAGE_SIZE)
 
-        for i in range(num_messages):
-            cur_entry = cur + 0x10 + MESSAGE_SIZE * i
-            message = self.get_messages()[i]
-
+        for message in self.get_messages():
             if message.text in strings:
                 message.offText = strings[message.text]
             else:
@@ -173,7 +182,7 @@ class Bmg:
                 strings[message.text] = message.offText
                 out_strings += _encode_string(message.text)
 
-            put_bytes(out_data, cur_entry, message.pack())
+        put_records(BMG_INF1_STRUCT, out_data, cur + 0x10, [message.to_record() for message in self.get_messages()])
 
         # DAT1
         cur += len_inf1
@@ -194,14 +203,99 @@ class Bmg:
         put_uint16(out_data, cur + 0x8, num_messages)
         put_uint8(out_data, cur + 0xA, 16)
 
-        for i in range(num_messages):
-            put_uint32(out_data, cur + 0x10 + i * MESGID_SIZE, i)
+        put_records(BMG_MID1_STRUCT, out_data, cur + 0x10, [(i,) for i in range(num_messages)])
 
         put_uint32(out_data, 0x08, len(out_data))
 
         return bytes(out_data)
 
 
+class BmgView:
+    def __init__(self, buf, cache_size: int = 1024):
+        if not (get_uint32(buf, 0x00) == MESG_MAGIC and get_uint32(buf, 0x04) == bmg1_MAGIC):
+            raise Exception("Error: Buffer does not contain MESGbmg1 data.")
+
+        self._buf = buf
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._id_lookup = None
+
+        # Locate the sections by their magic instead of relying on their order
+        sections = dict()
+        cur = 0x20
+        for _ in range(get_uint32(buf, 0x0C)):
+            if cur + 8 > len(buf):
+                break
+            sections[get_uint32(buf, cur)] = cur
+            cur += get_uint32(buf, cur + 0x04)
+
+        if INF1_MAGIC not in sections or DAT1_MAGIC not in sections:
+            raise Exception("Error: BMG data lacks INF1 or DAT1 section.")
+
+        # INF1, only the text offsets are unpacked, attributes are sliced on demand
+        cur = sections[INF1_MAGIC]
+        self._num_messages = get_uint16(buf, cur + 0x08)
+        self._len_messages = get_uint16(buf, cur + 0x0A)
+        self._off_entries = cur + 0x10
+
+        entry = struct.Struct(">I{0}x".format(self._len_messages - 4))
+        table = memoryview(buf)[self._off_entries:self._off_entries + self._len_messages * self._num_messages]
+        self._offsets = array("I", (record[0] for record in entry.iter_unpack(table)))
+        table.release()
+
+        # DAT1
+        self._off_strings = sections[DAT1_MAGIC] + 0x8
+
+        # MID1, a list of message IDs in the same order as the INF1 entries
+        self._ids = array("I")
+        if MID1_MAGIC in sections:
+            cur = sections[MID1_MAGIC]
+            num_ids = get_uint16(buf, cur + 0x08)
+            self._ids.frombytes(bytes(buf[cur + 0x10:cur + 0x10 + num_ids * MESGID_SIZE]))
+            if sys.byteorder == "little":
+                self._ids.byteswap()
+
+    def __len__(self):
+        return self._num_messages
+
+    def get_attributes(self, index: int) -> bytes:
+        off = self._off_entries + self._len_messages * index + 4
+        return bytes(self._buf[off:off + self._len_messages - 4])
+
+    def get_text(self, index: int) -> str:
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+
+        text = _decode_string(self._buf, self._off_strings + self._offsets[index])
+        self._cache[index] = text
+
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return text
+
+    def get_message(self, index: int) -> Message:
+        message = Message()
+        message.offText = self._offsets[index]
+        message.unk4 = self.get_attributes(index)
+        message.text = self.get_text(index)
+        return message
+
+    def get_id(self, index: int) -> int:
+        return self._ids[index] if index < len(self._ids) else index
+
+    def find(self, message_id: int) -> int:
+        # The lookup table is only built once IDs are actually queried
+        if self._id_lookup is None:
+            self._id_lookup = {message_id: index for index, message_id in enumerate(self._ids)}
+        return self._id_lookup.get(message_id, -1)
+
+    def get_text_by_id(self, message_id: int):
+        index = self.find(message_id)
+        return self.get_text(index) if index >= 0 else None
+
+
 def from_json(path: str):
     bmg = Bmg()
 
@@ -0,0 +1,151 @@
+import os
+import struct
+import zlib
+
+from tools.bitconv import put_records
+from tools.hashed import HashedFile
+
+CATALOGUE_MAGIC = 0x4143544C  # "ACTL"
+CATALOGUE_VERSION = 1
+
+# magic, version, schema, entry count, letter count, hash table offset, entry table offset, letter table offset,
+# string pool offset
+CATALOGUE_HEADER_STRUCT = struct.Struct(">9I")
+# name, manifest size, manifest mtime, manifest SHA-1, info.bin fields, item, design and NPC file, paper ID,
+# region IDs + 1, letter count, first letter
+CATALOGUE_ENTRY_STRUCT = struct.Struct(">IQQ20s5I3IB8sHI")
+# locale ID, header, body, footer, sender
+CATALOGUE_LETTER_STRUCT = struct.Struct(">H4I")
+
+
+def get_name_hash(name: str) -> int:
+    return zlib.crc32(name.encode("utf8"))
+
+
+def get_schema(tables: list) -> int:
+    # The IDs are indices into these tables, so a catalogue is only valid for the tables it was compiled with
+    return zlib.crc32("\n".join("\0".join(table) for table in tables).encode("utf8"))
+
+
+class CatalogueEntry:
+    def __init__(self, name: str, stamp: tuple, sha1: bytes, info: tuple, files: tuple, paper: int, regions: tuple,
+                 letters: dict):
+        self.name = name
+        self.stamp = stamp
+        self.sha1 = sha1
+        self.info = info
+        self.files = files
+        self.paper = paper
+        self.regions = regions
+        self.letters = letters
+
+
+def write_catalogue(path: str, schema: int, entries: list):
+    # Entries are sorted by the hashes of their names, so that they can be looked up by bisection
+    entries = sorted(entries, key=lambda entry: (get_name_hash(entry.name), entry.name))
+    pool = bytearray()
+    offsets = dict()
+
+    def put_string(text):
+        if text not in offsets:
+            data = text.encode("utf8")
+
+            if b"\0" in data:
+                raise Exception("Error: Catalogue strings cannot contain NUL characters.")
+
+            offsets[text] = len(pool)
+            pool.extend(data + b"\0")
+
+        return offsets[text]
+
+    entry_records = []
+    letter_records = []
+
+    for entry in entries:
+        regions = bytes(region + 1 for region in entry.regions)
+        entry_records.append((put_string(entry.name), *entry.stamp, entry.sha1, *entry.info,
+                              *[put_string(file_name) for file_name in entry.files], entry.paper, regions,
+                              len(entry.letters), len(letter_records)))
+
+        for locale, texts in sorted(entry.letters.items()):
+            letter_records.append((locale, *[put_string(text) for text in texts]))
+
+    hash_offset = CATALOGUE_HEADER_STRUCT.size
+    entry_offset = hash_offset + 4 * len(entry_records)
+    letter_offset = entry_offset + CATALOGUE_ENTRY_STRUCT.size * len(entry_records)
+    string_offset = letter_offset + CATALOGUE_LETTER_STRUCT.size * len(letter_records)
+
+    buf = bytearray(string_offset + len(pool))
+    CATALOGUE_HEADER_STRUCT.pack_into(buf, 0, CATALOGUE_MAGIC, CATALOGUE_VERSION, schema, len(entry_records),
+                                      len(letter_records), hash_offset, entry_offset, letter_offset, string_offset)
+    struct.pack_into(">{0}I".format(len(entries)), buf, hash_offset, *[get_name_hash(entry.name) for entry in entries])
+    put_records(CATALOGUE_ENTRY_STRUCT, buf, entry_offset, entry_records)
+    put_records(CATALOGUE_LETTER_STRUCT, buf, letter_offset, letter_records)
+    buf[string_offset:] = pool
+
+    # Readers may still have the old catalogue mapped, so it is replaced rather than overwritten
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(buf)
+    os.replace(path + ".tmp", path)
+
+
+class Catalogue(HashedFile):
+    HEADER_STRUCT = CATALOGUE_HEADER_STRUCT
+    MAGIC = CATALOGUE_MAGIC
+    VERSION = CATALOGUE_VERSION
+    DESCRIPTION = "a catalogue"
+
+    def __init__(self, path: str, schema: int):
+        self.schema = schema
+        super().__init__(path)
+
+    def _load_header(self, header: tuple):
+        if header[2] != self.schema:
+            raise Exception("Error: {0} was compiled for different papers, regions or locales.".format(self.path))
+
+        self._entry_offset, self._letter_offset = header[6:8]
+        self._load_tables(header[3], header[5], header[8])
+
+    def _get_args(self) -> tuple:
+        return self.path, self.schema
+
+    def _get_string(self, off: int) -> str:
+        return self._get_bytes(off).decode("utf8")
+
+    def _get_record(self, index: int) -> tuple:
+        return CATALOGUE_ENTRY_STRUCT.unpack_from(self._buf, self._entry_offset + CATALOGUE_ENTRY_STRUCT.size * index)
+
+    def _find(self, name: str) -> int:
+        key = name.encode("utf8")
+
+        for index in self._find_indices(get_name_hash(name)):
+            if self._get_bytes(self._get_record(index)[0]) == key:
+                return index
+
+        return -1
+
+    def get_names(self) -> list:
+        return [self._get_string(self._get_record(index)[0]) for index in range(self._count)]
+
+    def get_stamp(self, name: str):
+        index = self._find(name)
+        return self._get_record(index)[1:3] if index >= 0 else None
+
+    def get_entry(self, name: str):
+        index = self._find(name)
+
+        if index < 0:
+            return None
+
+        record = self._get_record(index)
+        letters = dict()
+
+        for i in range(record[15], record[15] + record[14]):
+            letter = CATALOGUE_LETTER_STRUCT.unpack_from(self._buf,
+                                                         self._letter_offset + CATALOGUE_LETTER_STRUCT.size * i)
+            letters[letter[0]] = tuple(self._get_string(off) for off in letter[1:])
+
+        return CatalogueEntry(name, record[1:3], record[3], record[4:9],
+                              tuple(self._get_string(off) for off in record[9:12]), record[12],
+                              tuple(region - 1 for region in record[13] if region), letters)
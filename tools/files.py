@@ -1,15 +1,56 @@
 import os
 
+from tools import profile
+
+CHUNK_SIZE = 0x100000
+
 
 def read_file(filepath: str):
     if not os.path.isfile(filepath):
         return None
 
-    with open(filepath, "rb") as f:
-        return f.read()
+    with profile.stage("files.read") as record, open(filepath, "rb") as f:
+        data = f.read()
+        record.nbytes = len(data)
+        return data
 
 
 def write_file(filepath: str, data):
-    with open(filepath, "wb") as f:
+    with profile.stage("files.write", len(data)), open(filepath, "wb") as f:
         f.write(data)
         f.flush()
+
+
+# asyncio is only imported by the async variants, it takes a while to import
+async def aread_file(filepath: str):
+    import asyncio
+
+    return await asyncio.to_thread(read_file, filepath)
+
+
+async def awrite_file(filepath: str, data):
+    import asyncio
+
+    await asyncio.to_thread(write_file, filepath, data)
+
+
+def read_chunks(f, chunk_size: int = CHUNK_SIZE):
+    while True:
+        with profile.stage("files.read") as record:
+            chunk = f.read(chunk_size)
+            record.nbytes = len(chunk)
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+class TeeWriter:
+    def __init__(self, *sinks):
+        self._sinks = sinks
+
+    def write(self, data):
+        for sink in self._sinks:
+            sink.write(data)
+        return len(data)
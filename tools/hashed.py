@@ -0,0 +1,89 @@
+import array
+import bisect
+import mmap
+import os
+import sys
+from abc import ABC, abstractmethod
+
+
+class HashedFile(ABC):
+    # A mapped file starting with a header of magic and version, with a table of record hashes sorted in ascending
+    # order and a pool of NUL-terminated strings. Opening only reads the header and the hashes, records are decoded
+    # from the mapping when they are used.
+    HEADER_STRUCT = None
+    MAGIC = 0
+    VERSION = 0
+    DESCRIPTION = "a hashed file"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._buf = b""
+
+        try:
+            if os.fstat(self._file.fileno()).st_size < self.HEADER_STRUCT.size:
+                raise Exception("Error: {0} is not {1}.".format(path, self.DESCRIPTION))
+
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            header = self.HEADER_STRUCT.unpack_from(self._buf, 0)
+            if header[0] != self.MAGIC or header[1] != self.VERSION:
+                raise Exception("Error: {0} is not {1} of version {2}.".format(path, self.DESCRIPTION, self.VERSION))
+
+            self._load_header(header)
+        except Exception:
+            self.close()
+            raise
+
+    @abstractmethod
+    def _load_header(self, header: tuple):
+        # Checks the remaining header fields and loads the tables with _load_tables
+        pass
+
+    def _load_tables(self, count: int, hash_offset: int, string_offset: int):
+        self._count = count
+        self._string_offset = string_offset
+
+        # A copy of the hashes in native byte order can be searched by the bisect module
+        self._hashes = array.array("I", self._buf[hash_offset:hash_offset + 4 * count])
+        if sys.byteorder == "little":
+            self._hashes.byteswap()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _get_args(self) -> tuple:
+        return (self.path,)
+
+    def __getstate__(self):
+        # The mapping cannot be passed to worker processes, they open the file again
+        return self._get_args()
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def close(self):
+        # The mapping stays alive for as long as views of it are still in use
+        if isinstance(self._buf, mmap.mmap):
+            try:
+                self._buf.close()
+            except BufferError:
+                pass
+        self._file.close()
+
+    def _find_indices(self, value: int):
+        index = bisect.bisect_left(self._hashes, value)
+
+        # Records with the same hash follow each other
+        while index < self._count and self._hashes[index] == value:
+            yield index
+            index += 1
+
+    def _get_bytes(self, off: int) -> bytes:
+        off += self._string_offset
+        return self._buf[off:self._buf.find(b"\0", off)]
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+
+from tools.files import read_chunks
+
+
+class BuildState:
+    def __init__(self, path: str):
+        self.path = path
+        self._files = dict()
+        self._outputs = dict()
+
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf8") as f:
+                state = json.load(f)
+
+            self._files = state.get("Files", dict())
+            self._outputs = state.get("Outputs", dict())
+
+    @staticmethod
+    def _get_stamp(path: str):
+        try:
+            stat = os.stat(path)
+            return [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            return None
+
+    def hash_file(self, path: str) -> str:
+        stamp = self._get_stamp(path)
+
+        if stamp is None:
+            return "missing"
+
+        # Files are only hashed again if their size or modification time changed
+        known = self._files.get(path)
+        if known and known[0] == stamp:
+            return known[1]
+
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in read_chunks(f):
+                sha1.update(chunk)
+
+        self._files[path] = [stamp, sha1.hexdigest()]
+        return sha1.hexdigest()
+
+    def hash_inputs(self, values: list, paths: list) -> str:
+        sha1 = hashlib.sha1()
+
+        for value in values:
+            sha1.update(json.dumps(value).encode("utf8") + b"\0")
+        for path in paths:
+            sha1.update(path.encode("utf8") + b"\0" + self.hash_file(path).encode("ascii") + b"\0")
+
+        return sha1.hexdigest()
+
+    def is_current(self, key: str, digest: str) -> bool:
+        output = self._outputs.get(key)
+
+        if not output or output["Digest"] != digest:
+            return False
+
+        # Outputs that were deleted or touched since the last build are stale as well
+        return all(self._get_stamp(path) == stamp for path, stamp in output["Files"].items())
+
+    def get_outputs(self, key: str) -> list:
+        return list(self._outputs[key]["Files"]) if key in self._outputs else []
+
+    def update(self, key: str, digest: str, paths: list):
+        self._outputs[key] = {"Digest": digest, "Files": {path: self._get_stamp(path) for path in paths}}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        state = {"Files": self._files, "Outputs": self._outputs}
+
+        # Write to a temporary file first so that an interrupted build never leaves a broken state behind
+        with open(self.path + ".tmp", "w", encoding="utf8") as f:
+            json.dump(state, f, indent=4)
+            f.flush()
+        os.replace(self.path + ".tmp", self.path)
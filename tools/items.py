@@ -0,0 +1,127 @@
+import hashlib
+import os
+
+ITEM_NAME_SIZE = 0x22
+ITEM_NAME_OFFSETS = {
+    "Japanese": 0x012,
+    "UsEnglish": 0x034,
+    "UsSpanish": 0x056,
+    "UsFrench": 0x078,
+    "EuEnglish": 0x09A,
+    "German": 0x0BC,
+    "Italian": 0x0DE,
+    "EuSpanish": 0x100,
+    "EuFrench": 0x122,
+    "Korean": 0x144
+}
+
+
+def get_item_name(itemdata, off):
+    return bytes(itemdata[off:off+ITEM_NAME_SIZE]).decode("utf-16-be").strip("\0")
+
+
+def get_item_names(itemdata):
+    ret = dict()
+    for locale, off in ITEM_NAME_OFFSETS.items():
+        ret[locale] = get_item_name(itemdata, off)
+    return ret
+
+
+class ItemIndex:
+    def __init__(self, path: str = "build/items.db", folder: str = "items/"):
+        # Only imported here, reading item names does not need the database
+        import sqlite3
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.folder = folder
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS items (file TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, sha1 TEXT);
+            CREATE TABLE IF NOT EXISTS names (id INTEGER PRIMARY KEY, file TEXT, locale TEXT, name TEXT);
+            CREATE INDEX IF NOT EXISTS names_by_file ON names (file);
+        """)
+
+        # Substring searches use a trigram index if the SQLite library supports it
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS names_fts USING fts5(name, tokenize='trigram')")
+            self._fts = True
+        except sqlite3.OperationalError:
+            self._fts = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def refresh(self) -> tuple:
+        known = {row[0]: (row[1], row[2]) for row in self._db.execute("SELECT file, size, mtime FROM items")}
+        updated = 0
+
+        with self._db:
+            # Only files whose size or modification time changed are read and decoded again
+            for entry in os.scandir(self.folder):
+                if not entry.is_file() or entry.name == "dummy":
+                    continue
+
+                stat = entry.stat()
+                if known.pop(entry.name, None) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+
+                with open(entry.path, "rb") as f:
+                    itemdata = f.read()
+
+                try:
+                    names = get_item_names(itemdata)
+                except UnicodeDecodeError:
+                    names = dict()
+
+                self._db.execute("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)",
+                                 (entry.name, stat.st_size, stat.st_mtime_ns, hashlib.sha1(itemdata).hexdigest()))
+                self._remove_names(entry.name)
+
+                for locale, name in names.items():
+                    cursor = self._db.execute("INSERT INTO names (file, locale, name) VALUES (?, ?, ?)",
+                                              (entry.name, locale, name))
+                    if self._fts:
+                        self._db.execute("INSERT INTO names_fts (rowid, name) VALUES (?, ?)", (cursor.lastrowid, name))
+                updated += 1
+
+            # Whatever is left over was removed from the folder
+            for file in known:
+                self._db.execute("DELETE FROM items WHERE file = ?", (file,))
+                self._remove_names(file)
+
+        return updated, len(known)
+
+    def _remove_names(self, file: str):
+        if self._fts:
+            self._db.execute("DELETE FROM names_fts WHERE rowid IN (SELECT id FROM names WHERE file = ?)", (file,))
+        self._db.execute("DELETE FROM names WHERE file = ?", (file,))
+
+    def find(self, text: str, locale: str = None, limit: int = 100) -> list:
+        query = "SELECT names.file, locale, names.name, sha1 FROM names JOIN items ON items.file = names.file "
+
+        # Trigrams need at least three characters, shorter queries fall back to scanning the names
+        if self._fts and len(text) >= 3:
+            query += "WHERE names.id IN (SELECT rowid FROM names_fts WHERE names_fts MATCH ?)"
+            params = ['"' + text.replace('"', '""') + '"']
+        else:
+            query += "WHERE names.name LIKE ? ESCAPE '\\'"
+            params = ["%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"]
+
+        if locale:
+            query += " AND locale = ?"
+            params.append(locale)
+
+        query += " ORDER BY names.file, locale LIMIT ?"
+        params.append(limit)
+
+        return self._db.execute(query, params).fetchall()
+
+    def get_names(self, file: str) -> dict:
+        rows = self._db.execute("SELECT locale, name FROM names WHERE file = ?", (file,))
+        return {locale: name for locale, name in rows}
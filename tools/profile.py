@@ -0,0 +1,202 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_profiler = None
+_local = threading.local()
+_region = contextvars.ContextVar("region", default=None)
+
+
+class StageRecord:
+    def __init__(self, name: str, region: str = None):
+        self.name = name
+        self.region = region
+        self.nbytes = 0
+        self.start = 0.0
+        self.seconds = 0.0
+        self.child_seconds = 0.0
+        self.peak = 0
+        self.thread = 0
+
+
+_NULL_RECORD = StageRecord("")
+
+
+class Profiler:
+    def __init__(self, trace_memory: bool = True):
+        # tracemalloc is only imported once profiling is enabled, every module that is instrumented imports this one
+        import tracemalloc
+
+        self.tracemalloc = tracemalloc
+        self.records = []
+        self.trace_memory = trace_memory
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._active = dict()
+        self._overlaps = 0
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def close(self):
+        if self.trace_memory and self.tracemalloc.is_tracing():
+            self.tracemalloc.stop()
+
+    def add(self, record: StageRecord):
+        with self._lock:
+            self.records.append(record)
+
+    def enter(self, thread: int) -> int:
+        # Counts how often stages of different threads overlapped, as their peaks cannot be told apart
+        with self._lock:
+            overlaps = self._overlaps
+            if any(other != thread for other in self._active):
+                self._overlaps += 1
+            self._active[thread] = self._active.get(thread, 0) + 1
+            return overlaps
+
+    def leave(self, thread: int) -> int:
+        with self._lock:
+            self._active[thread] -= 1
+            if not self._active[thread]:
+                del self._active[thread]
+            return self._overlaps
+
+    def get_summary(self) -> list:
+        summary = dict()
+
+        for record in self.records:
+            key = (record.name, record.region or "")
+            entry = summary.setdefault(key, {"Stage": record.name, "Region": record.region or "", "Calls": 0,
+                                             "Seconds": 0.0, "SelfSeconds": 0.0, "Bytes": 0, "PeakAlloc": 0})
+            entry["Calls"] += 1
+            entry["Seconds"] += record.seconds
+            entry["SelfSeconds"] += record.seconds - record.child_seconds
+            entry["Bytes"] += record.nbytes
+            if entry["PeakAlloc"] is not None:
+                entry["PeakAlloc"] = None if record.peak is None else max(entry["PeakAlloc"], record.peak)
+
+        return sorted(summary.values(), key=lambda entry: -entry["SelfSeconds"])
+
+    def format_table(self) -> str:
+        lines = ["{0:<18} {1:<6} {2:>7} {3:>10} {4:>10} {5:>12} {6:>10} {7:>12}".format(
+            "stage", "region", "calls", "total s", "self s", "bytes", "MiB/s", "peak alloc")]
+
+        for entry in self.get_summary():
+            rate = entry["Bytes"] / entry["Seconds"] / 0x100000 if entry["Seconds"] and entry["Bytes"] else 0.0
+            lines.append("{0:<18} {1:<6} {2:>7} {3:>10.4f} {4:>10.4f} {5:>12} {6:>10.2f} {7:>12}".format(
+                entry["Stage"], entry["Region"], entry["Calls"], entry["Seconds"], entry["SelfSeconds"],
+                entry["Bytes"], rate, "-" if entry["PeakAlloc"] is None else entry["PeakAlloc"]))
+
+        return "\n".join(lines)
+
+    def save(self, path: str):
+        import json
+
+        # The Chrome trace format ignores unknown keys, so the summary can live in the same file
+        events = [{
+            "name": record.name,
+            "cat": record.region or "global",
+            "ph": "X",
+            "ts": (record.start - self._origin) * 1000000,
+            "dur": record.seconds * 1000000,
+            "pid": os.getpid(),
+            "tid": record.thread,
+            "args": {"region": record.region, "bytes": record.nbytes, "peak_alloc": record.peak}
+        } for record in self.records]
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "stages": self.get_summary()}, f, indent=4)
+            f.flush()
+
+
+def enable(trace_memory: bool = True) -> Profiler:
+    global _profiler
+    _profiler = Profiler(trace_memory)
+    return _profiler
+
+
+def disable():
+    global _profiler
+    if _profiler:
+        _profiler.close()
+    _profiler = None
+
+
+def get_profiler() -> Profiler:
+    return _profiler
+
+
+@contextmanager
+def region(name: str):
+    # A context variable rather than a thread-local, so that asyncio.to_thread keeps the region
+    token = _region.set(name)
+
+    try:
+        yield
+    finally:
+        _region.reset(token)
+
+
+@contextmanager
+def stage(name: str, nbytes: int = 0):
+    profiler = _profiler
+
+    if profiler is None:
+        yield _NULL_RECORD
+        return
+
+    record = StageRecord(name, _region.get())
+    record.nbytes = nbytes
+    record.thread = threading.get_ident()
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+
+    tracemalloc = profiler.tracemalloc
+    tracing = profiler.trace_memory and tracemalloc.is_tracing()
+    if tracing:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    overlaps = profiler.enter(record.thread)
+    stack.append(record)
+    record.start = time.perf_counter()
+
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - record.start
+        stack.pop()
+
+        # The peak is global to the process, so it is dropped if a stage of another thread ran at the same time.
+        # Nested stages reset the peak, so their peaks are carried over to the enclosing stage.
+        if profiler.leave(record.thread) != overlaps or record.peak is None:
+            record.peak = None
+        elif tracing:
+            record.peak = max(record.peak, tracemalloc.get_traced_memory()[1] - base)
+        if stack:
+            stack[-1].child_seconds += record.seconds
+            if stack[-1].peak is not None:
+                stack[-1].peak = None if record.peak is None else max(stack[-1].peak, record.peak)
+
+        profiler.add(record)
+
+
+def profiled(name: str):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name) as record:
+                result = func(*args, **kwargs)
+                record.nbytes = len(result) if hasattr(result, "__len__") else 0
+                return result
+
+        return wrapper
+
+    return decorator
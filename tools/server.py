@@ -0,0 +1,133 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+
+class LruCache:
+    def __init__(self, max_size: int, sizeof=len):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+
+        # Values that would evict everything else are not worth keeping
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+
+            self._entries[key] = (value, size)
+            self.size += size
+
+            while self.size > self.max_size:
+                self.size -= self._entries.popitem(last=False)[1][1]
+
+    def get_stats(self) -> dict:
+        return {"Entries": len(self._entries), "Size": self.size, "MaxSize": self.max_size, "Hits": self.hits,
+                "Misses": self.misses}
+
+
+class _BuildRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: dict):
+        self._send(status, json.dumps(data).encode("utf8"), "application/json")
+
+    def do_GET(self):
+        parts = [unquote(part) for part in urlsplit(self.path).path.split("/") if part]
+
+        if parts == ["status"]:
+            self._send_json(200, self.server.service.get_stats())
+            return
+
+        if len(parts) != 3 or parts[0] != "packages":
+            self._send_json(404, {"Error": "Unknown path, use /packages/<name>/<region> or /status"})
+            return
+
+        try:
+            file_name, data = self.server.service.build(parts[1], parts[2])
+        except KeyError as e:
+            self._send_json(404, {"Error": str(e.args[0]) if e.args else "Not found"})
+        except ValueError as e:
+            self._send_json(400, {"Error": str(e)})
+        except TimeoutError as e:
+            self._send_json(503, {"Error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"Error": "{0}: {1}".format(type(e).__name__, e)})
+        else:
+            self._send(200, data, "application/octet-stream",
+                       {"Content-Disposition": 'attachment; filename="{0}"'.format(file_name)})
+
+
+class _UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer expects a host and port, which a socket path does not have
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def create_server(service, host: str = "127.0.0.1", port: int = 8024, socket_path: str = None,
+                  verbose: bool = False):
+    # The service needs build(name, region) -> (file name, bytes) and get_stats() -> dict
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _BuildRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), _BuildRequestHandler)
+
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
@@ -0,0 +1,129 @@
+import os
+
+RSA_BACKEND_ENV = "ACWC24_RSA_BACKEND"
+RSA_BACKEND_ORDER = ["cryptography", "gmpy2", "crt", "rsa"]
+SHA1_DIGEST_INFO = bytes.fromhex("3021300906052B0E03021A05000414")
+
+
+def get_pkcs1_block(digest: bytes, keylen: int) -> bytes:
+    # EMSA-PKCS1-v1_5 encoding of a SHA-1 digest, which is what gets signed
+    digest_info = SHA1_DIGEST_INFO + digest
+    return b"\x00\x01" + b"\xFF" * (keylen - 3 - len(digest_info)) + b"\x00" + digest_info
+
+
+class _CryptographySigner:
+    def __init__(self, pem):
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding, utils
+
+        self._key = serialization.load_pem_private_key(bytes(pem), None)
+        self._padding = padding.PKCS1v15()
+        self._algorithm = utils.Prehashed(hashes.SHA1())
+
+        numbers = self._key.public_key().public_numbers()
+        self.n = numbers.n
+        self.e = numbers.e
+
+    def sign(self, digest: bytes) -> bytes:
+        return self._key.sign(digest, self._padding, self._algorithm)
+
+
+class _CrtSigner:
+    def __init__(self, pem, powmod=pow, integer=int):
+        import rsa
+
+        key = rsa.PrivateKey.load_pkcs1(bytes(pem), "PEM")
+        self.n = key.n
+        self.e = key.e
+        self._keylen = (key.n.bit_length() + 7) // 8
+        self._powmod = powmod
+        self._p, self._q, self._dp, self._dq, self._qinv = [integer(value) for value in
+                                                             (key.p, key.q, key.exp1, key.exp2, key.coef)]
+
+    def sign(self, digest: bytes) -> bytes:
+        message = int.from_bytes(get_pkcs1_block(digest, self._keylen), "big")
+        powmod = self._powmod
+
+        # Two half-size exponentiations instead of one with the full private exponent
+        m1 = powmod(message, self._dp, self._p)
+        m2 = powmod(message, self._dq, self._q)
+        signed = int(m2 + (self._qinv * (m1 - m2) % self._p) * self._q)
+
+        # A faulty CRT result would leak the key, so it is checked with the cheap public exponent
+        if pow(signed, self.e, self.n) != message:
+            raise Exception("Error: RSA signature verification failed.")
+
+        return signed.to_bytes(self._keylen, "big")
+
+
+class _GmpySigner(_CrtSigner):
+    def __init__(self, pem):
+        import gmpy2
+
+        super().__init__(pem, gmpy2.powmod, gmpy2.mpz)
+
+
+class _RsaSigner:
+    def __init__(self, pem):
+        import rsa
+
+        self._rsa = rsa
+        self._key = rsa.PrivateKey.load_pkcs1(bytes(pem), "PEM")
+        self.n = self._key.n
+        self.e = self._key.e
+
+    def sign(self, digest: bytes) -> bytes:
+        return self._rsa.sign_hash(digest, self._key, "SHA-1")
+
+
+class RsaBackend:
+    def __init__(self, name: str, signer_class):
+        self.name = name
+        self._signer_class = signer_class
+
+    def load_key(self, pem):
+        return self._signer_class(pem)
+
+
+_BACKENDS = {
+    "cryptography": (["cryptography.hazmat.primitives.asymmetric.rsa"], _CryptographySigner),
+    "gmpy2": (["gmpy2", "rsa"], _GmpySigner),
+    "crt": (["rsa"], _CrtSigner),
+    "rsa": (["rsa"], _RsaSigner)
+}
+_available = {}
+
+
+def is_rsa_backend_available(name: str) -> bool:
+    if name not in _available:
+        try:
+            for module in _BACKENDS[name][0]:
+                __import__(module)
+            _available[name] = True
+        except ImportError:
+            _available[name] = False
+
+    return _available[name]
+
+
+def get_rsa_backends() -> list:
+    return [name for name in RSA_BACKEND_ORDER if is_rsa_backend_available(name)]
+
+
+def get_rsa_backend(name: str = None) -> RsaBackend:
+    name = name or os.environ.get(RSA_BACKEND_ENV)
+
+    if name:
+        if name not in _BACKENDS:
+            raise Exception("Error: Unknown RSA backend \"{0}\".".format(name))
+        if not is_rsa_backend_available(name):
+            raise Exception("Error: RSA backend \"{0}\" is not installed.".format(name))
+    else:
+        available = get_rsa_backends()
+
+        if not available:
+            raise Exception("Error: No RSA module found. Install cryptography, gmpy2 or rsa.")
+
+        name = available[0]
+
+    return RsaBackend(name, _BACKENDS[name][1])
@@ -1,4 +1,11 @@
+import hashlib
+import io
+import mmap
+import os
+
+from tools import profile
 from tools.bitconv import *
+from tools.files import CHUNK_SIZE, read_chunks
 
 U8_MAGIC = 0x55AA382D
 NODE_SIZE = 0xC
@@ -21,20 +28,75 @@ class _U8Node:
         e.lenData = get_uint32(buf, off + 0x08)
         return e
 
+    @staticmethod
+    def from_record(record):
+        e = _U8Node()
+        e.isDir = record[0] >> 24 != 0
+        e.offName = record[0] & 0xFFFFFF
+        e.offData = record[1]
+        e.lenData = record[2]
+        return e
+
+    def to_record(self) -> tuple:
+        return (1 << 24 if self.isDir else 0) | self.offName, self.offData, self.lenData
+
     def pack(self) -> bytes:
         b = bytearray(NODE_SIZE)
-        put_bool(b, 0x00, self.isDir)
-        put_uint24(b, 0x01, self.offName)
-        put_uint32(b, 0x04, self.offData)
-        put_uint32(b, 0x08, self.lenData)
+        self.pack_into(b, 0)
         return bytes(b)
 
+    def pack_into(self, buf, off):
+        put_bool(buf, off + 0x00, self.isDir)
+        put_uint24(buf, off + 0x01, self.offName)
+        put_uint32(buf, off + 0x04, self.offData)
+        put_uint32(buf, off + 0x08, self.lenData)
+
 
 class U8:
     def __init__(self):
         self._files = {}
+        self._handle = None
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def open(path):
+        archive = U8()
+        archive._handle = open(path, "rb")
+
+        try:
+            if os.fstat(archive._handle.fileno()).st_size == 0:
+                raise Exception("Error: Buffer does not contain U8 data.")
+
+            archive._mmap = mmap.mmap(archive._handle.fileno(), 0, access=mmap.ACCESS_READ)
+            archive.load(archive._mmap, lazy=True)
+        except Exception:
+            archive.close()
+            raise
+
+        return archive
+
+    def close(self):
+        # Views into the mapped file have to be released before it can be unmapped
+        views = [data for data in self._files.values() if isinstance(data, memoryview)]
+        self._files.clear()
+
+        for view in views:
+            view.release()
+
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
 
-    def load(self, buf):
+    def load(self, buf, lazy: bool = False):
         if not buf:
             return
 
@@ -46,86 +108,115 @@ class U8:
         offdata = get_uint32(buf, 0x0C)
 
         rootnode = _U8Node.unpack(buf, offroot)
-        nodes = [_U8Node.unpack(buf, offroot + NODE_SIZE * (i + 1)) for i in range(rootnode.lenData - 1)]
+        records = get_records(U8_NODE_STRUCT, buf, offroot + NODE_SIZE, rootnode.lenData - 1)
+        nodes = [_U8Node.from_record(record) for record in records]
         stringspos = offroot + rootnode.lenData * NODE_SIZE
+        strings = bytes(buf[stringspos:offroot + lennodes])
 
-        recursion = [rootnode.lenData]
+        # Lazy archives hand out views into the buffer instead of copying every file up front
+        view = memoryview(buf) if lazy else buf
+
+        recursion = []
         recursiondir = []
         counter = 0
         for node in nodes:
             counter += 1
-            name = get_string(buf, stringspos + node.offName, "latin-1")
+            name = get_string(strings, node.offName, "latin-1")
+
+            # Leave every directory that ends in front of this node
+            while recursion and recursion[-1] <= counter:
+                recursion.pop()
+                recursiondir.pop()
+
+            path = '/'.join(recursiondir + [name])
 
             if node.isDir:
-                path = '/'.join(recursiondir + [name])
                 recursion.append(node.lenData)
                 recursiondir.append(name)
                 self._files[path] = None
             else:
-                path = '/'.join(recursiondir + [name])
-                data = buf[node.offData:node.offData + node.lenData]
+                data = view[node.offData:node.offData + node.lenData]
                 self._files[path] = data
 
-            if len(recursiondir):
-                sz = recursion.pop()
-                if sz != counter + 1:
-                    recursion.append(sz)
-                else:
-                    recursiondir.pop()
-
-    def save(self):
-        buf = bytearray(0x20)
-        put_uint32(buf, 0x00, U8_MAGIC)
-        put_uint32(buf, 0x04, ROOT_OFFSET)
-
+    def _layout(self, sizes: dict):
         rootnode = _U8Node()
         rootnode.isDir = True
         nodes = [rootnode]
-        strings = bytearray(1)
-        fulldata = bytearray()
-        paths = self.get_paths()
+        names = [b"\0"]
+        files = []
+        dirs = []
+        lenstrings = 1
 
-        for path in paths:
-            data = self._files[path]
+        def add_node(name, node):
+            nonlocal lenstrings
+            node.offName = lenstrings
+            names.append(name.encode("latin-1") + b"\0")
+            lenstrings += len(names[-1])
+            nodes.append(node)
+
+        def add_dir(parts):
             node = _U8Node()
-            node.isDir = data is None
-            node.offName = len(strings)
+            node.isDir = True
+            node.offData = dirs[-1][1] if dirs else 0
+            dirs.append((parts, len(nodes)))
+            add_node(parts[-1], node)
 
-            name = path.split('/')[-1]
-            strings += (name + "\0").encode("latin-1")
+        # Sorting by path components puts every directory right in front of its contents
+        for path in sorted(self._files, key=lambda p: p.split('/')):
+            parts = path.split('/')
 
-            recursion = path.count('/')
-            if recursion < 0:
-                recursion = 0
+            while dirs and parts[:len(dirs[-1][0])] != dirs[-1][0]:
+                nodes[dirs.pop()[1]].lenData = len(nodes)
 
-            if node.isDir:
-                node.offData = recursion
-                node.lenData = len(nodes)
-                for subpath in paths:
-                    if subpath[:len(path)] == path:
-                        node.lenData += 1
+            # Parent directories that were not added explicitly
+            for depth in range(len(dirs) + 1, len(parts)):
+                add_dir(parts[:depth])
+
+            if self._files[path] is None:
+                add_dir(parts)
             else:
-                node.offData = len(fulldata)
-                node.lenData = len(data)
-                fulldata += data + bytearray(align32(node.lenData) - node.lenData)
+                node = _U8Node()
+                node.lenData = sizes[path]
+                files.append((path, node))
+                add_node(parts[-1], node)
 
-            nodes.append(node)
+        while dirs:
+            nodes[dirs.pop()[1]].lenData = len(nodes)
+        rootnode.lenData = len(nodes)
 
-        lennodes = NODE_SIZE * len(nodes) + len(strings)
+        # Assign the aligned data offsets now that the size of the node table is known
+        lennodes = NODE_SIZE * len(nodes) + lenstrings
         offdata = align32(ROOT_OFFSET + lennodes)
-        rootnode.lenData = len(nodes)
+        size = offdata
 
+        for path, node in files:
+            node.offData = size
+            size += align32(node.lenData)
+
+        return nodes, b"".join(names), files, offdata, size
+
+    def _pack_header(self, buf, nodes, strings, offdata):
+        lennodes = NODE_SIZE * len(nodes) + len(strings)
+
+        put_uint32(buf, 0x00, U8_MAGIC)
+        put_uint32(buf, 0x04, ROOT_OFFSET)
         put_uint32(buf, 0x08, lennodes)
         put_uint32(buf, 0x0C, offdata)
 
-        for node in nodes:
-            if not node.isDir:
-                node.offData += offdata
-            buf += node.pack()
+        put_records(U8_NODE_STRUCT, buf, ROOT_OFFSET, [node.to_record() for node in nodes])
+        put_bytes(buf, ROOT_OFFSET + NODE_SIZE * len(nodes), strings)
+
+    @profile.profiled("U8.save")
+    def save(self):
+        sizes = {path: len(data) for path, data in self._files.items() if data is not None}
+        nodes, strings, files, offdata, size = self._layout(sizes)
+
+        # Everything is written into one preallocated buffer, padding is already zeroed
+        buf = bytearray(size)
+        self._pack_header(buf, nodes, strings, offdata)
 
-        buf += strings
-        buf += bytearray(offdata - lennodes - ROOT_OFFSET)
-        buf += fulldata
+        for path, node in files:
+            buf[node.offData:node.offData + node.lenData] = self._files[path]
 
         return bytes(buf)
 
@@ -143,3 +234,86 @@ class U8:
 
     def add_file(self, path, data):
         self._files[path] = data
+
+
+class U8Writer(U8):
+    # Files are added as bytes-like objects, file paths or readable file objects
+    @staticmethod
+    def _get_size(source) -> int:
+        if isinstance(source, str):
+            return os.path.getsize(source)
+        if hasattr(source, "read"):
+            return os.fstat(source.fileno()).st_size - source.tell()
+        return len(source)
+
+    def _write_source(self, sink, source, size: int, chunk_size: int):
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                return self._write_source(sink, f, size, chunk_size)
+
+        if not hasattr(source, "read"):
+            sink.write(source)
+            return
+
+        written = 0
+        for chunk in read_chunks(source, chunk_size):
+            written += len(chunk)
+            sink.write(chunk)
+
+        if written != size:
+            raise Exception("Error: File size changed while writing U8 data.")
+
+    def __getstate__(self):
+        # Archives are passed to worker processes with their paths and data. Views into mapped files cannot be pickled,
+        # so they are copied.
+        state = dict(self.__dict__)
+        state["_files"] = {path: bytes(source) if isinstance(source, memoryview) else source
+                           for path, source in self._files.items()}
+        return state
+
+    def get_digest(self) -> str:
+        # Identifies the archive contents without writing it. File sources are identified by their path, size and
+        # modification time, file objects only match themselves.
+        sha1 = hashlib.sha1()
+
+        for path in sorted(self._files):
+            source = self._files[path]
+            sha1.update(path.encode("utf8") + b"\0")
+
+            if source is None:
+                sha1.update(b"dir")
+            elif isinstance(source, str):
+                stat = os.stat(source)
+                sha1.update("file:{0}:{1}:{2}".format(source, stat.st_size, stat.st_mtime_ns).encode("utf8"))
+            elif hasattr(source, "read"):
+                sha1.update("object:{0}".format(id(source)).encode("utf8"))
+            else:
+                sha1.update(b"data:" + hashlib.sha1(source).digest())
+
+            sha1.update(b"\0")
+
+        return sha1.hexdigest()
+
+    def save(self):
+        out = io.BytesIO()
+        self.write(out)
+        return out.getvalue()
+
+    def write(self, sink, chunk_size: int = CHUNK_SIZE) -> int:
+        sizes = {path: self._get_size(source) for path, source in self._files.items() if source is not None}
+        nodes, strings, files, offdata, size = self._layout(sizes)
+
+        with profile.stage("U8.write", size):
+            self._write_all(sink, nodes, strings, files, offdata, chunk_size)
+
+        return size
+
+    def _write_all(self, sink, nodes, strings, files, offdata, chunk_size: int):
+        # Header, node table and string pool first, then every payload followed by its padding
+        header = bytearray(offdata)
+        self._pack_header(header, nodes, strings, offdata)
+        sink.write(header)
+
+        for path, node in files:
+            self._write_source(sink, self._files[path], node.lenData, chunk_size)
+            sink.write(bytes(align32(node.lenData) - node.lenData))
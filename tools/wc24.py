@@ -1,9 +1,14 @@
+import hashlib
+import hmac
+import io
 import os
-import pyaes
-import rsa
+import threading
 
+from tools import profile
+from tools.aes import get_aes_backend
 from tools.bitconv import get_uint32, get_bytes, put_uint8, put_uint32, put_bytes
-from tools.files import read_file
+from tools.files import CHUNK_SIZE, read_chunks, read_file
+from tools.signer import get_pkcs1_block, get_rsa_backend
 
 WC24_MAGIC = 0x57433234
 WC24_HEADER_SIZE = 0x30
@@ -13,42 +18,205 @@ SIGNATURE_OFFSET = 0x40
 SIGNATURE_SIZE = 256
 DATA_OFFSET = 0x140
 
-RSA_KEY = read_file("rvforestdl.pem.bin")
-AES_KEY = read_file("rvforestdl.aes.bin")
+RSA_KEY_PATH = "rvforestdl.pem.bin"
+AES_KEY_PATH = "rvforestdl.aes.bin"
+KEY_DIR_ENV = "ACWC24_KEY_DIR"
 
 
-def is_wc24_keys_available() -> bool:
-    return RSA_KEY and AES_KEY
+class Wc24Keys:
+    # The keys are read on first use and the crypto modules are only imported once they are needed
+    def __init__(self, rsa_path: str = None, aes_path: str = None):
+        folder = os.environ.get(KEY_DIR_ENV, "")
+        self.rsa_path = rsa_path or os.path.join(folder, RSA_KEY_PATH)
+        self.aes_path = aes_path or os.path.join(folder, AES_KEY_PATH)
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._rsa_key = None
+        self._aes_key = None
+        self._signer = None
+        self._aes = None
 
+    def _get_stamp(self):
+        stamp = []
 
-def decrypt(data) -> bytes:
-    if not is_wc24_keys_available():
+        for path in (self.rsa_path, self.aes_path):
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                stamp.append(None)
+
+        return stamp
+
+    def _refresh(self):
+        # Reload the keys and drop everything derived from them once the files change on disk
+        stamp = self._get_stamp()
+
+        if stamp != self._stamp:
+            self._rsa_key = read_file(self.rsa_path)
+            self._aes_key = read_file(self.aes_path)
+            self._signer = None
+            self._aes = None
+            self._stamp = stamp
+
+    def set_paths(self, rsa_path: str, aes_path: str):
+        with self._lock:
+            self.rsa_path = rsa_path
+            self.aes_path = aes_path
+            self._stamp = None
+
+    def is_available(self) -> bool:
+        with self._lock:
+            self._refresh()
+            return bool(self._rsa_key and self._aes_key)
+
+    def get_signer(self):
+        with self._lock:
+            self._refresh()
+
+            if self._signer is None and self._rsa_key:
+                self._signer = get_rsa_backend().load_key(self._rsa_key)
+
+            return self._signer
+
+    def get_aes(self):
+        with self._lock:
+            self._refresh()
+
+            if self._aes is None and self._aes_key:
+                self._aes = get_aes_backend().load_key(self._aes_key)
+
+            return self._aes
+
+
+DEFAULT_KEYS = Wc24Keys()
+
+
+def set_key_dir(folder: str, keys: Wc24Keys = None):
+    (keys or DEFAULT_KEYS).set_paths(os.path.join(folder, RSA_KEY_PATH), os.path.join(folder, AES_KEY_PATH))
+
+
+def is_wc24_keys_available(keys: Wc24Keys = None) -> bool:
+    return (keys or DEFAULT_KEYS).is_available()
+
+
+def decrypt(data, keys: Wc24Keys = None) -> bytes:
+    keys = keys or DEFAULT_KEYS
+
+    if not keys.is_available():
         raise Exception("RSA-AES keys not initialized. Can't decrypt data.")
     if get_uint32(data, 0x00) != WC24_MAGIC:
         raise Exception("Error: No WC24 data given. Can't extract U8 data.")
 
     iv = get_bytes(data, INIT_VECTOR_OFFSET, INIT_VECTOR_SIZE)
-    aes = pyaes.AESModeOfOperationOFB(AES_KEY, iv=iv)
+    aes = keys.get_aes().ofb(iv)
+
+    return aes.update(memoryview(data)[DATA_OFFSET:])
+
+
+def verify_signature(digest: bytes, signature, keys: Wc24Keys = None) -> bool:
+    signer = (keys or DEFAULT_KEYS).get_signer()
+    keylen = (signer.n.bit_length() + 7) // 8
+    signed = int.from_bytes(signature, "big")
+
+    if len(signature) != keylen or signed >= signer.n:
+        return False
+
+    # Rebuild the PKCS#1 v1.5 block that must have been signed and compare against it
+    clearsig = pow(signed, signer.e, signer.n).to_bytes(keylen, "big")
+    return hmac.compare_digest(clearsig, get_pkcs1_block(digest, keylen))
+
+
+def decrypt_stream(src, dst=None, keys: Wc24Keys = None, chunk_size: int = CHUNK_SIZE) -> bool:
+    keys = keys or DEFAULT_KEYS
+
+    if not keys.is_available():
+        raise Exception("RSA-AES keys not initialized. Can't decrypt data.")
+
+    header = src.read(DATA_OFFSET)
+
+    if len(header) != DATA_OFFSET or get_uint32(header, 0x00) != WC24_MAGIC:
+        raise Exception("Error: No WC24 data given. Can't extract U8 data.")
+
+    iv = get_bytes(header, INIT_VECTOR_OFFSET, INIT_VECTOR_SIZE)
+    signature = get_bytes(header, SIGNATURE_OFFSET, SIGNATURE_SIZE)
+    aes = keys.get_aes().ofb(iv)
+    sha1 = hashlib.sha1()
+
+    # Decrypt and hash chunk by chunk so that memory usage does not depend on the file size
+    for chunk in read_chunks(src, chunk_size):
+        decrypted = aes.update(chunk)
+        sha1.update(decrypted)
+
+        if dst:
+            dst.write(decrypted)
+
+    return verify_signature(sha1.digest(), signature, keys)
+
+
+def verify_file(path: str, keys: Wc24Keys = None, chunk_size: int = CHUNK_SIZE) -> bool:
+    with open(path, "rb") as f:
+        header = f.read(DATA_OFFSET)
+
+        # Only version 1 files encrypted with AES-OFB are supported
+        if len(header) == DATA_OFFSET and get_uint32(header, 0x00) == WC24_MAGIC:
+            if get_uint32(header, 0x04) != 1 or header[0x0C] != 1:
+                raise Exception("Error: Unsupported WC24 version or encryption type.")
+
+        f.seek(0)
+        return decrypt_stream(f, None, keys, chunk_size)
+
+
+class Wc24Writer:
+    def __init__(self, dst, keys: Wc24Keys = None):
+        self._keys = keys or DEFAULT_KEYS
+
+        if not self._keys.is_available():
+            raise Exception("RSA-AES keys not initialized. Can't encrypt data.")
+
+        self._dst = dst
+        self._start = dst.tell()
+        self._sha1 = hashlib.sha1()
+        self._size = 0
+
+        iv = os.urandom(INIT_VECTOR_SIZE)
+        self._aes = self._keys.get_aes().ofb(iv)
+
+        # The signature is only known at the end, so it gets patched into the header later
+        header = bytearray(DATA_OFFSET)
+        put_uint32(header, 0x00, WC24_MAGIC)
+        put_uint32(header, 0x04, 1)
+        put_uint8(header, 0x0C, 1)
+        put_bytes(header, INIT_VECTOR_OFFSET, iv)
+        dst.write(header)
+
+    def write(self, data):
+        with profile.stage("wc24.encrypt", len(data)):
+            self._sha1.update(data)
+            encrypted = self._aes.update(data)
+
+        with profile.stage("files.write", len(data)):
+            self._dst.write(encrypted)
+
+        self._size += len(data)
+        return len(data)
 
-    return aes.decrypt(data[DATA_OFFSET:])
+    def finish(self) -> bytes:
+        with profile.stage("wc24.sign"):
+            signature = self._keys.get_signer().sign(self._sha1.digest())
+        end = self._dst.tell()
 
+        self._dst.seek(self._start + SIGNATURE_OFFSET)
+        self._dst.write(signature)
+        self._dst.seek(end)
 
-def encrypt(data) -> bytes:
-    if not is_wc24_keys_available():
-        raise Exception("RSA-AES keys not initialized. Can't encrypt data.")
+        return signature
 
-    privkey = rsa.PrivateKey.load_pkcs1(RSA_KEY, "PEM")
-    signature = rsa.sign(data, privkey, "SHA-1")
-    iv = os.urandom(INIT_VECTOR_SIZE)
-    aes = pyaes.AESModeOfOperationOFB(AES_KEY, iv=iv)
-    encrypted = aes.encrypt(data)
 
-    outdata = bytearray(WC24_HEADER_SIZE + INIT_VECTOR_SIZE + SIGNATURE_SIZE + len(encrypted))
-    put_uint32(outdata, 0x00, WC24_MAGIC)
-    put_uint32(outdata, 0x04, 1)
-    put_uint8(outdata, 0x0C, 1)
-    put_bytes(outdata, INIT_VECTOR_OFFSET, iv)
-    put_bytes(outdata, SIGNATURE_OFFSET, signature)
-    put_bytes(outdata, DATA_OFFSET, encrypted)
+def encrypt(data, keys: Wc24Keys = None) -> bytes:
+    out = io.BytesIO()
+    writer = Wc24Writer(out, keys)
+    writer.write(data)
+    writer.finish()
 
-    return bytes(outdata)
+    return out.getvalue()